@@ -8,11 +8,21 @@ import sys
 import time
 import threading
 import queue
-from typing import Dict, Any, Optional, Tuple, List
+import selectors
+from typing import Dict, Any, Optional, Tuple, List, Callable, FrozenSet
 import logging
 import shutil
 import signal
+import stat
+import atexit
 import re
+import ast
+import functools
+import glob
+import hashlib
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from types import MappingProxyType
 try:
     import resource
     HAS_RESOURCE = True
@@ -22,121 +32,502 @@ except ImportError:
 logger = logging.getLogger(__name__)
 
 
+# Language configurations, shared by every executor
+_LANGUAGE_CONFIG = MappingProxyType({
+    'python': {
+        'extension': '.py',
+        'command': [sys.executable],
+        'inline_flag': '-c',
+        'allowed_imports': frozenset({'math', 'random', 'datetime', 'json', 'collections', 'itertools', 'functools'})
+    },
+    'javascript': {
+        'extension': '.js',
+        'command': ['node'],
+        'inline_flag': '-e',
+        'allowed_globals': frozenset({'console', 'Math', 'Date', 'JSON', 'Array', 'Object', 'String', 'Number'})
+    },
+    'typescript': {
+        'extension': '.ts',
+        'command': ['npx', 'ts-node'],
+        'setup_commands': ['npm install -g typescript ts-node'],
+        'allowed_globals': frozenset({'console', 'Math', 'Date', 'JSON', 'Array', 'Object', 'String', 'Number'})
+    },
+    'java': {
+        'extension': '.java',
+        'compile_command': ['javac'],
+        'command': ['java'],
+        'needs_compile': True,
+        'allowed_packages': frozenset({'java.util', 'java.lang', 'java.math', 'java.time'})
+    },
+    'cpp': {
+        'extension': '.cpp',
+        'compile_command': ['g++', '-o', 'program'],
+        'command': ['./program'],
+        'needs_compile': True,
+        'allowed_headers': frozenset({'iostream', 'string', 'vector', 'map', 'set', 'algorithm'})
+    },
+    'c': {
+        'extension': '.c',
+        'compile_command': ['gcc', '-o', 'program'],
+        'command': ['./program'],
+        'needs_compile': True,
+        'allowed_headers': frozenset({'stdio.h', 'stdlib.h', 'string.h', 'math.h', 'time.h'})
+    },
+    'go': {
+        'extension': '.go',
+        'command': ['go', 'run'],
+        'allowed_packages': frozenset({'fmt', 'math', 'time', 'strings', 'strconv'})
+    },
+    'rust': {
+        'extension': '.rs',
+        'compile_command': ['rustc', '-o', 'program'],
+        'command': ['./program'],
+        'needs_compile': True,
+        'allowed_crates': frozenset({'std'})
+    },
+    'ruby': {
+        'extension': '.rb',
+        'command': ['ruby'],
+        'inline_flag': '-e',
+        'allowed_requires': frozenset({'json', 'time', 'math', 'set'})
+    },
+    'php': {
+        'extension': '.php',
+        'command': ['php'],
+        'allowed_extensions': frozenset({'json', 'date', 'math'})
+    }
+})
+
+# Patterns used by validation and Java class detection, compiled once
+_JAVA_IMPORT_RE = re.compile(r'import\s+([\w.]+)')
+_C_INCLUDE_RE = re.compile(r'#include\s+[<"]([\w./]+)[>"]')
+_JAVA_CLASS_RE = re.compile(r'public\s+class\s+(\w+)')
+
+# Python names and module attributes that may not be referenced. The names
+# are also denied as attributes (__builtins__.exec) and as string constants
+# (getattr(obj, 'exec'), globals()['__builtins__'])
+_PY_DANGEROUS_NAMES = frozenset({'eval', 'exec', '__import__', '__builtins__'})
+_PY_DANGEROUS_ATTRS = frozenset({('os', 'system'), ('subprocess', 'call')})
+
+# Denied JavaScript tokens, matched with a single scan over the source
+_JS_DANGEROUS_GLOBALS = ('process', 'require', 'eval', 'Function')
+_JS_DENY_RE = re.compile('|'.join(map(re.escape, _JS_DANGEROUS_GLOBALS)))
+
+# Cap on captured stdout/stderr per run; the program is stopped once exceeded
+MAX_OUTPUT_BYTES = 1024 * 1024
+
+# Free space /dev/shm needs before workdirs are placed on it
+MIN_TMPFS_FREE_BYTES = 256 * 1024 * 1024
+
+# Pooled output buffers are dropped after this long without a run
+BUFFER_IDLE_SECONDS = 60
+
+# Process/thread cap applied inside the bubblewrap sandbox
+SANDBOX_NPROC = 64
+
+# Host paths the sandbox sees (read-only): system binaries and libraries, the
+# loader cache and toolchain config. Home directories, the rest of /etc and
+# the app itself (with its .env) stay hidden.
+SANDBOX_RO_PATHS = ('/usr', '/bin', '/sbin', '/lib', '/lib32', '/lib64', '/libx32',
+                    '/etc/alternatives', '/etc/ld.so.cache', '/etc/localtime')
+
+# Toolchain config directories under /etc, by glob (the JDK reads jvm.cfg here)
+SANDBOX_RO_GLOBS = ('/etc/java-*',)
+
+# Largest source passed inline on the command line (Linux caps a single
+# argument at 128 KiB); anything bigger is written to a file
+MAX_INLINE_SOURCE_BYTES = 64 * 1024
+
+# Harnesses run by pre-spawned interpreter workers. A worker blocks on stdin
+# until it is handed a request framed as "<source length>\n<source><stdin>",
+# runs the source as __main__ and exits, so each worker serves exactly one run.
+_PYTHON_WORKER_HARNESS = """\
+import sys, linecache, math, random, datetime, json, collections, itertools, functools
+_src = sys.stdin.buffer.read(int(sys.stdin.buffer.readline())).decode('utf-8')
+linecache.cache['main.py'] = (len(_src), None, _src.splitlines(True), 'main.py')
+_code = compile(_src, 'main.py', 'exec')
+del _src
+try:
+    exec(_code, {'__name__': '__main__', '__builtins__': __builtins__})
+except SystemExit:
+    raise
+except BaseException as _e:
+    import traceback
+    traceback.print_exception(type(_e), _e, _e.__traceback__.tb_next)
+    sys.exit(1)
+"""
+
+_NODE_WORKER_HARNESS = """\
+const chunks = [];
+process.stdin.on('data', (chunk) => chunks.push(chunk));
+process.stdin.on('end', () => {
+  const buf = Buffer.concat(chunks);
+  const nl = buf.indexOf(10);
+  const src = buf.subarray(nl + 1, nl + 1 + parseInt(buf.subarray(0, nl).toString(), 10));
+  require('vm').runInThisContext(src.toString('utf8'), { filename: 'main.js' });
+});
+"""
+
+_WORKER_COMMANDS = {
+    'python': [sys.executable, '-c', _PYTHON_WORKER_HARNESS],
+    'javascript': ['node', '-e', _NODE_WORKER_HARNESS]
+}
+
+
+def _workdir_base() -> str:
+    """Pick the directory that hosts execution workdirs, preferring tmpfs
+    
+    /dev/shm is only used when programs can be executed from it and it has
+    room to spare; containers commonly mount it noexec with 64 MB.
+    """
+    if os.path.isdir('/dev/shm') and os.access('/dev/shm', os.W_OK):
+        try:
+            info = os.statvfs('/dev/shm')
+        except OSError:
+            return tempfile.gettempdir()
+        if not info.f_flag & os.ST_NOEXEC and info.f_bavail * info.f_frsize >= MIN_TMPFS_FREE_BYTES:
+            return '/dev/shm'
+    return tempfile.gettempdir()
+
+
+def _cpu_limit(timeout: int) -> int:
+    """Soft RLIMIT_CPU in seconds, a second above the wall-clock timeout"""
+    # Pre-spawned workers spend CPU on interpreter startup before the
+    # deadline starts, so most busy loops still reach the deadline. Those
+    # that hit this limit first get SIGXCPU (the hard limit is a second
+    # later) and are reported as timeouts too, see _run_result.
+    return int(timeout) + 1
+
+
+def _private_dir(path: str) -> bool:
+    """Create path as a 0700 directory, or check that the existing one is
+    owned by this user and writable by nobody else"""
+    try:
+        os.mkdir(path, 0o700)
+    except FileExistsError:
+        pass
+    info = os.lstat(path)
+    return (stat.S_ISDIR(info.st_mode) and info.st_uid == os.getuid()
+            and not info.st_mode & (stat.S_IWGRP | stat.S_IWOTH))
+
+
 class CodeExecutor:
-    def __init__(self, timeout: int = 30, max_memory: int = 512):
+    def __init__(self, timeout: int = 30, max_memory: int = 512, workdir_pool_size: int = 8,
+                 worker_pool_size: int = 2, build_cache_size: int = 128,
+                 validation_cache_size: int = 1024):
         """Initialize code executor
         
         Args:
             timeout: Maximum execution time in seconds
             max_memory: Maximum memory usage in MB
+            workdir_pool_size: Number of reusable working directories kept ready
+            worker_pool_size: Number of pre-spawned interpreters kept per language
+            build_cache_size: Number of compiled programs kept for reruns
+            validation_cache_size: Number of validation results kept for repeat inputs
         """
         self.timeout = timeout
         self.max_memory = max_memory * 1024 * 1024  # Convert to bytes
+        # (timeout seconds, memory bytes) applied when a call sets no limits
+        self._limits = (self.timeout, self.max_memory)
+        self.language_config = _LANGUAGE_CONFIG
         
-        # Language configurations
-        self.language_config = {
-            'python': {
-                'extension': '.py',
-                'command': [sys.executable],
-                'allowed_imports': {'math', 'random', 'datetime', 'json', 'collections', 'itertools', 'functools'}
-            },
-            'javascript': {
-                'extension': '.js',
-                'command': ['node'],
-                'allowed_globals': {'console', 'Math', 'Date', 'JSON', 'Array', 'Object', 'String', 'Number'}
-            },
-            'typescript': {
-                'extension': '.ts',
-                'command': ['npx', 'ts-node'],
-                'setup_commands': ['npm install -g typescript ts-node'],
-                'allowed_globals': {'console', 'Math', 'Date', 'JSON', 'Array', 'Object', 'String', 'Number'}
-            },
-            'java': {
-                'extension': '.java',
-                'compile_command': ['javac'],
-                'command': ['java'],
-                'needs_compile': True,
-                'allowed_packages': {'java.util', 'java.lang', 'java.math', 'java.time'}
-            },
-            'cpp': {
-                'extension': '.cpp',
-                'compile_command': ['g++', '-o', 'program'],
-                'command': ['./program'],
-                'needs_compile': True,
-                'allowed_headers': {'iostream', 'string', 'vector', 'map', 'set', 'algorithm'}
-            },
-            'c': {
-                'extension': '.c',
-                'compile_command': ['gcc', '-o', 'program'],
-                'command': ['./program'],
-                'needs_compile': True,
-                'allowed_headers': {'stdio.h', 'stdlib.h', 'string.h', 'math.h', 'time.h'}
-            },
-            'go': {
-                'extension': '.go',
-                'command': ['go', 'run'],
-                'allowed_packages': {'fmt', 'math', 'time', 'strings', 'strconv'}
-            },
-            'rust': {
-                'extension': '.rs',
-                'compile_command': ['rustc', '-o', 'program'],
-                'command': ['./program'],
-                'needs_compile': True,
-                'allowed_crates': {'std'}
-            },
-            'ruby': {
-                'extension': '.rb',
-                'command': ['ruby'],
-                'allowed_requires': {'json', 'time', 'math', 'set'}
-            },
-            'php': {
-                'extension': '.php',
-                'command': ['php'],
-                'allowed_extensions': {'json', 'date', 'math'}
-            }
+        # Pool of pre-created working directories (on tmpfs when available).
+        # LIFO so sequential requests keep reusing the same, cache-hot directory.
+        self.workdir_pool_size = workdir_pool_size
+        self._workdir_root = tempfile.mkdtemp(prefix='devsensei-', dir=_workdir_base())
+        atexit.register(shutil.rmtree, self._workdir_root, True)
+        self._workdir_pool: queue.LifoQueue = queue.LifoQueue()
+        for _ in range(workdir_pool_size):
+            self._workdir_pool.put(tempfile.mkdtemp(dir=self._workdir_root))
+        
+        # Content-addressed cache of compiled artifacts, shared across processes.
+        # Kept on disk in the user cache (not tmpfs, which may be noexec and
+        # is RAM-backed). Keys are tracked in LRU order (oldest first) for
+        # eviction. Cached binaries are run as-is, so the directory must be
+        # private to this user; entries are published from mkdtemp staging
+        # dirs and so are 0700 too.
+        self.build_cache_size = build_cache_size
+        cache_dir = os.path.join(
+            os.environ.get('XDG_CACHE_HOME', os.path.expanduser('~/.cache')), 'devsensei'
+        )
+        self._build_cache_dir = os.path.join(cache_dir, 'builds')
+        try:
+            os.makedirs(cache_dir, 0o700, exist_ok=True)
+            private = _private_dir(self._build_cache_dir)
+        except OSError:
+            private = False
+        if not private:
+            logger.warning(f"{self._build_cache_dir} is not private to this user; "
+                           "caching builds for this process only")
+            self._build_cache_dir = tempfile.mkdtemp(prefix='builds-', dir=self._workdir_root)
+        self._build_lru: OrderedDict = OrderedDict()
+        self._build_lock = threading.Lock()
+        with os.scandir(self._build_cache_dir) as entries:
+            cached = sorted((e for e in entries if e.is_dir()), key=lambda e: e.stat().st_mtime)
+        for entry in cached:
+            self._build_lru[entry.name] = None
+        
+        # Validation results keyed by (source digest, language), in LRU order;
+        # the UI revalidates the same source on every debounced keystroke
+        self.validation_cache_size = validation_cache_size
+        self._validation_lru: OrderedDict = OrderedDict()
+        self._validation_lock = threading.Lock()
+        
+        # Resource limits are applied by the prlimit(1) wrapper when available so
+        # that no Python code runs between fork and exec
+        prlimit = shutil.which('prlimit')
+        self._prlimit = prlimit
+        
+        # bubblewrap sandbox (no network, read-only system paths and
+        # toolchains, writable workdir only). Enabled once the warm-up probe
+        # confirms bwrap works on this host.
+        self._bwrap = shutil.which('bwrap') if prlimit else None
+        self._sandbox_binds: List[str] = []
+        self._sandbox_ready = False
+        
+        # Absolute paths of the interpreters/compilers, resolved once instead of
+        # letting every spawn repeat the PATH search
+        self._toolchains: Dict[str, Optional[str]] = {}
+        self._toolchain_lock = threading.Lock()
+        
+        # Pre-spawned, single-use interpreter workers (see _WORKER_COMMANDS)
+        self.worker_pool_size = worker_pool_size
+        self._worker_pools: Dict[str, queue.Queue] = {
+            language: queue.Queue() for language in _WORKER_COMMANDS
         }
+        threading.Thread(target=self._warm_toolchains, daemon=True).start()
+        
+        # Bounded pool for execute_code_async; its size caps how many programs
+        # run concurrently, so a burst of requests cannot fork-bomb the host
+        max_workers = min(32, (os.cpu_count() or 1) * 4)
+        self._exec_pool = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix='code-exec'
+        )
+        
+        # Recycled stdout/stderr capture buffers, two per concurrent run. They are
+        # allocated on first use and released by a reaper once runs go idle.
+        self._buffer_pool: queue.LifoQueue = queue.LifoQueue()
+        self._buffer_pool_size = 2 * max_workers
+        self._buffers_used_at = 0.0
+        self._buffer_reaper: Optional[threading.Thread] = None
+    
+    def _warm_toolchains(self):
+        """Resolve every configured toolchain binary ahead of the first request"""
+        for config in self.language_config.values():
+            for key in ('compile_command', 'command'):
+                if key in config:
+                    self._resolve_command(config[key])
+        # The sandbox mounts depend on where the toolchains live
+        self._sandbox_binds = self._sandbox_ro_binds()
+        self._probe_sandbox()
+        for language in self._worker_pools:
+            for _ in range(self.worker_pool_size):
+                self._spawn_worker(language)
+    
+    def _resolve_command(self, command: List[str]) -> Optional[List[str]]:
+        """Return command with its executable resolved to an absolute path
+        
+        Returns None if the executable is not installed on this host.
+        """
+        name = command[0]
+        if os.path.dirname(name):
+            # Relative paths such as ./program are resolved against cwd by exec
+            return command
+        with self._toolchain_lock:
+            if name not in self._toolchains:
+                self._toolchains[name] = shutil.which(name)
+            path = self._toolchains[name]
+        if path is None:
+            return None
+        return [path] + command[1:]
+    
+    def _acquire_workdir(self) -> str:
+        """Take an empty working directory from the pool"""
+        try:
+            return self._workdir_pool.get_nowait()
+        except queue.Empty:
+            return tempfile.mkdtemp(dir=self._workdir_root)
+    
+    def _release_workdir(self, workdir: str, artifacts: Tuple[str, ...] = ()):
+        """Empty a working directory and return it to the pool
+        
+        Args:
+            workdir: Directory taken from _acquire_workdir
+            artifacts: Paths the run is known to create; when they are all that
+                is left, the directory is emptied without scanning it
+        """
+        if artifacts and self._clear_artifacts(workdir, artifacts):
+            self._return_workdir(workdir)
+            return
+        
+        try:
+            # Only the top level is walked; nested trees are rare (user code)
+            with os.scandir(workdir) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        shutil.rmtree(entry.path)
+                    else:
+                        os.unlink(entry.path)
+        except Exception as e:
+            logger.error(f"Error resetting working directory: {str(e)}")
+            shutil.rmtree(workdir, ignore_errors=True)
+            return
+        
+        self._return_workdir(workdir)
+    
+    def _clear_artifacts(self, workdir: str, artifacts: Tuple[str, ...]) -> bool:
+        """Unlink known artifacts; returns False if anything else was left"""
+        for path in artifacts:
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            except OSError:
+                return False
+        # rmdir doubles as the emptiness check; ENOTEMPTY means leftovers
+        try:
+            os.rmdir(workdir)
+        except OSError:
+            return False
+        os.mkdir(workdir, 0o700)
+        return True
+    
+    def _return_workdir(self, workdir: str):
+        """Put an empty working directory back in the pool, or drop it"""
+        if self._workdir_pool.qsize() < self.workdir_pool_size:
+            self._workdir_pool.put(workdir)
+        else:
+            os.rmdir(workdir)
+    
+    def _spawn_worker(self, language: str):
+        """Start an interpreter worker and add it to the language's pool"""
+        command = self._resolve_command(_WORKER_COMMANDS[language])
+        if command is None:
+            return
+        workdir = self._acquire_workdir()
+        command, preexec_fn = self._with_limits(command, workdir)
+        try:
+            process = subprocess.Popen(
+                command,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                **self._spawn_options(workdir, preexec_fn)
+            )
+        except Exception as e:
+            logger.error(f"Error starting {language} worker: {str(e)}")
+            self._release_workdir(workdir)
+            return
+        self._worker_pools[language].put((process, workdir))
+    
+    def _replenish_worker(self, language: str):
+        """Spawn a replacement worker in the background"""
+        threading.Thread(target=self._spawn_worker, args=(language,), daemon=True).start()
+    
+    def _take_worker(self, language: str) -> Optional[Tuple[subprocess.Popen, str]]:
+        """Take a live worker for the language from its pool"""
+        pool = self._worker_pools.get(language)
+        while pool is not None:
+            try:
+                process, workdir = pool.get_nowait()
+            except queue.Empty:
+                return None
+            if process.poll() is None:
+                return process, workdir
+            # Worker died while idle; drop it and try the next one
+            process.communicate()
+            self._release_workdir(workdir)
+            self._replenish_worker(language)
+        return None
+    
+    def _build_key(self, code: str, language: str, compiler: str) -> str:
+        """Key a build by source, language and the compiler binary's identity"""
+        info = os.stat(compiler)
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(f'{language}\0{compiler}\0{info.st_mtime_ns}\0{info.st_size}\0'.encode('utf-8'))
+        digest.update(code.encode('utf-8'))
+        return digest.hexdigest()
+    
+    def _restore_build(self, key: str, workdir: str) -> bool:
+        """Copy cached artifacts for key into workdir; returns False on a miss"""
+        cache_path = os.path.join(self._build_cache_dir, key)
+        try:
+            for name in os.listdir(cache_path):
+                shutil.copy2(os.path.join(cache_path, name), workdir)
+        except OSError:
+            return False
+        with self._build_lock:
+            self._build_lru[key] = None
+            self._build_lru.move_to_end(key)
+        return True
+    
+    def _store_build(self, key: str, workdir: str, source_path: str):
+        """Save everything the compiler produced in workdir under key"""
+        staging = tempfile.mkdtemp(dir=self._build_cache_dir, prefix='.staging-')
+        try:
+            with os.scandir(workdir) as entries:
+                for entry in entries:
+                    if entry.path != source_path and entry.is_file(follow_symlinks=False):
+                        shutil.copy2(entry.path, staging)
+            # Atomic publish; another process may have stored the same key already
+            os.rename(staging, os.path.join(self._build_cache_dir, key))
+        except OSError:
+            shutil.rmtree(staging, ignore_errors=True)
+            return
+        
+        with self._build_lock:
+            self._build_lru[key] = None
+            evicted = []
+            while len(self._build_lru) > self.build_cache_size:
+                evicted.append(self._build_lru.popitem(last=False)[0])
+        for old_key in evicted:
+            shutil.rmtree(os.path.join(self._build_cache_dir, old_key), ignore_errors=True)
     
     def _validate_code(self, code: str, language: str) -> Tuple[bool, str]:
-        """Validate code for security and allowed features"""
+        """Validate code for security and allowed features, reusing cached results"""
+        key = (hashlib.blake2b(code.encode('utf-8'), digest_size=16).digest(), language)
+        with self._validation_lock:
+            result = self._validation_lru.get(key)
+            if result is not None:
+                self._validation_lru.move_to_end(key)
+                return result
+        
+        result = self._check_code(code, language)
+        with self._validation_lock:
+            self._validation_lru[key] = result
+            while len(self._validation_lru) > self.validation_cache_size:
+                self._validation_lru.popitem(last=False)
+        return result
+    
+    def _check_code(self, code: str, language: str) -> Tuple[bool, str]:
+        """Run the per-language validation checks"""
         try:
             config = self.language_config[language]
             
             if language == 'python':
-                # Check for dangerous imports
-                import_pattern = re.compile(r'import\s+(\w+)|from\s+(\w+)\s+import')
-                imports = import_pattern.findall(code)
-                for imp in imports:
-                    module = imp[0] or imp[1]
-                    if module not in config['allowed_imports']:
-                        return False, f"Import of {module} not allowed"
-                
-                # Check for dangerous functions
-                dangerous_funcs = {'eval', 'exec', 'os.system', 'subprocess.call'}
-                for func in dangerous_funcs:
-                    if func in code:
-                        return False, f"Use of {func} not allowed"
+                return self._validate_python(code, config['allowed_imports'])
             
             elif language in ['javascript', 'typescript']:
                 # Check for dangerous globals
-                dangerous_globals = {'process', 'require', 'eval', 'Function'}
-                for global_var in dangerous_globals:
-                    if global_var in code:
-                        return False, f"Use of {global_var} not allowed"
+                match = _JS_DENY_RE.search(code)
+                if match:
+                    return False, f"Use of {match.group()} not allowed"
             
             elif language == 'java':
                 # Check for dangerous packages
-                import_pattern = re.compile(r'import\s+([\w.]+)')
-                imports = import_pattern.findall(code)
+                imports = _JAVA_IMPORT_RE.findall(code)
+                allowed = tuple(config['allowed_packages'])
                 for imp in imports:
-                    if not any(imp.startswith(pkg) for pkg in config['allowed_packages']):
+                    if not imp.startswith(allowed):
                         return False, f"Import of {imp} not allowed"
             
             elif language in ['cpp', 'c']:
                 # Check for dangerous headers
-                include_pattern = re.compile(r'#include\s+[<"]([\w./]+)[>"]')
-                includes = include_pattern.findall(code)
+                includes = _C_INCLUDE_RE.findall(code)
+                allowed = config['allowed_headers']
                 for inc in includes:
-                    if inc not in config['allowed_headers']:
+                    if inc not in allowed:
                         return False, f"Include of {inc} not allowed"
             
             return True, ""
@@ -145,25 +536,204 @@ class CodeExecutor:
             logger.error(f"Error validating code: {str(e)}")
             return False, f"Validation error: {str(e)}"
     
-    def _set_resource_limits(self):
+    def _validate_python(self, code: str, allowed_imports: FrozenSet[str]) -> Tuple[bool, str]:
+        """Validate Python code with a single parse and AST walk"""
+        try:
+            tree = ast.parse(code, mode='exec')
+        except SyntaxError as e:
+            return False, f"Syntax error: {e.msg} (line {e.lineno})"
+        
+        for node in ast.walk(tree):
+            # Check for dangerous imports
+            if isinstance(node, ast.Import):
+                for alias in node.names:
+                    module = alias.name.split('.')[0]
+                    if module not in allowed_imports:
+                        return False, f"Import of {module} not allowed"
+            elif isinstance(node, ast.ImportFrom):
+                module = node.module.split('.')[0] if node.module else '.' * node.level
+                if module not in allowed_imports:
+                    return False, f"Import of {module} not allowed"
+            # Check for dangerous functions
+            elif isinstance(node, ast.Name):
+                if node.id in _PY_DANGEROUS_NAMES:
+                    return False, f"Use of {node.id} not allowed"
+            elif isinstance(node, ast.Attribute):
+                if node.attr in _PY_DANGEROUS_NAMES:
+                    return False, f"Use of {node.attr} not allowed"
+                if isinstance(node.value, ast.Name) and (node.value.id, node.attr) in _PY_DANGEROUS_ATTRS:
+                    return False, f"Use of {node.value.id}.{node.attr} not allowed"
+            elif isinstance(node, ast.Constant) and isinstance(node.value, str):
+                if node.value in _PY_DANGEROUS_NAMES:
+                    return False, f"Use of {node.value} not allowed"
+        
+        return True, ""
+    
+    def _set_resource_limits(self, limits: Tuple[int, int]):
         """Set resource limits for the process (Unix only)"""
         if not HAS_RESOURCE:
             return
+        timeout, max_memory = limits
+        cpu_limit = _cpu_limit(timeout)
         try:
-            resource.setrlimit(resource.RLIMIT_AS, (self.max_memory, self.max_memory))
-            resource.setrlimit(resource.RLIMIT_CPU, (self.timeout, self.timeout))
+            resource.setrlimit(resource.RLIMIT_AS, (max_memory, max_memory))
+            resource.setrlimit(resource.RLIMIT_CPU, (cpu_limit, cpu_limit + 1))
             resource.setrlimit(resource.RLIMIT_FSIZE, (1024 * 1024, 1024 * 1024))
             resource.setrlimit(resource.RLIMIT_NPROC, (1, 1))
         except Exception as e:
             logger.error(f"Error setting resource limits: {str(e)}")
     
-    def execute_code(self, code: str, language: str, input_data: str = "") -> Dict[str, Any]:
+    def _sandbox_ro_binds(self) -> List[str]:
+        """Read-only bwrap binds for SANDBOX_RO_PATHS plus the Python install
+        and any toolchain living outside them (pyenv, venvs, /opt)"""
+        paths = [path for path in SANDBOX_RO_PATHS if os.path.lexists(path)]
+        for pattern in SANDBOX_RO_GLOBS:
+            paths.extend(sorted(glob.glob(pattern)))
+        
+        prefixes = {sys.base_prefix, sys.prefix}
+        with self._toolchain_lock:
+            executables = [path for path in self._toolchains.values() if path]
+        home = os.path.expanduser('~')
+        for executable in executables:
+            bin_dir = os.path.dirname(os.path.realpath(executable))
+            prefix = os.path.dirname(bin_dir)
+            # The install root of .../bin/<tool> (or a version manager's
+            # .../shims/<tool>), but never / or a whole home directory
+            if os.path.basename(bin_dir) not in ('bin', 'shims') or prefix in ('/', home):
+                prefix = bin_dir
+            prefixes.add(prefix)
+            # rustup's proxies in ~/.cargo/bin run toolchains kept in RUSTUP_HOME
+            if os.path.exists(os.path.join(bin_dir, 'rustup')):
+                prefixes.add(os.environ.get('RUSTUP_HOME', os.path.join(home, '.rustup')))
+        for prefix in sorted(prefixes):
+            if not os.path.exists(prefix):
+                continue
+            if not any(prefix == path or prefix.startswith(path + os.sep) for path in paths):
+                paths.append(prefix)
+        
+        binds = []
+        for path in paths:
+            binds.extend(('--ro-bind', path, path))
+        return binds
+    
+    def _sandbox_args(self, workdir: str) -> List[str]:
+        """bwrap arguments confining a process to workdir"""
+        return [
+            self._bwrap,
+            '--unshare-all',
+            '--die-with-parent',
+            *self._sandbox_binds,
+            '--dev', '/dev',
+            '--proc', '/proc',
+            '--tmpfs', '/tmp',
+            '--bind', workdir, workdir,
+            '--chdir', workdir,
+            '--'
+        ]
+    
+    def _probe_sandbox(self):
+        """Enable the bwrap sandbox if it can actually start on this host"""
+        if not self._bwrap:
+            return
+        workdir = self._acquire_workdir()
+        try:
+            probe = subprocess.run(
+                # The interpreter, so a missing bind shows up here
+                self._sandbox_args(workdir) + [sys.executable, '-c', 'pass'],
+                cwd=workdir,
+                capture_output=True,
+                timeout=10
+            )
+            self._sandbox_ready = probe.returncode == 0
+            if not self._sandbox_ready:
+                logger.error(f"bwrap sandbox unavailable: {probe.stderr.decode('utf-8', 'replace').strip()}")
+        except Exception as e:
+            logger.error(f"bwrap sandbox unavailable: {str(e)}")
+        finally:
+            self._release_workdir(workdir)
+    
+    def _with_limits(self, command: List[str], workdir: str,
+                     limits: Optional[Tuple[int, int]] = None) -> Tuple[List[str], Optional[Callable[[], None]]]:
+        """Wrap a command so it runs under the resource limits
+        
+        Returns the command to spawn and the preexec_fn to pass along. The
+        preexec_fn is only needed when prlimit is missing; without it CPython
+        can use its vfork/posix_spawn fast path instead of fork+exec.
+        
+        Args:
+            limits: (timeout seconds, memory bytes), the executor's by default
+        """
+        limits = limits or self._limits
+        if not self._prlimit:
+            return command, functools.partial(self._set_resource_limits, limits)
+        timeout, max_memory = limits
+        cpu_limit = _cpu_limit(timeout)
+        prefix = [self._prlimit, f'--as={max_memory}', f'--cpu={cpu_limit}:{cpu_limit + 1}', f'--fsize={1024 * 1024}']
+        if self._sandbox_ready:
+            # Inside bwrap NPROC is relaxed so interpreters can start their
+            # helper threads (libuv, JVM GC)
+            return self._sandbox_args(workdir) + prefix + [f'--nproc={SANDBOX_NPROC}', '--'] + command, None
+        return prefix + ['--nproc=1', '--'] + command, None
+    
+    def _spawn_options(self, workdir: str, preexec_fn: Optional[Callable[[], None]],
+                       compile: bool = False) -> Dict[str, Any]:
+        """Popen keyword arguments for a process that should run in workdir
+        
+        A timeout must be able to kill the whole process tree (compiler
+        drivers run cc1/ld, user programs may fork). Inside bwrap that holds
+        already (--die-with-parent and a PID namespace); outside it the
+        process leads its own session for _kill.
+        
+        Compilers inside bwrap are started through posix_spawn, which CPython
+        only uses when no cwd or session is requested and fds are inherited;
+        bwrap changes into workdir itself. User programs never inherit fds,
+        since C extensions in this process (grpc, torch, faiss) may hold fds
+        without O_CLOEXEC.
+        """
+        if compile and preexec_fn is None and self._sandbox_ready:
+            return {'close_fds': False}
+        options = {'cwd': workdir, 'preexec_fn': preexec_fn}
+        if not self._sandbox_ready:
+            options['start_new_session'] = True
+        return options
+    
+    def _compile(self, command: List[str], workdir: str, preexec_fn: Optional[Callable[[], None]],
+                 timeout: int) -> subprocess.CompletedProcess:
+        """Run a compiler under the timeout, killing its whole tree on expiry"""
+        process = subprocess.Popen(
+            command,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            **self._spawn_options(workdir, preexec_fn, compile=True)
+        )
+        try:
+            stdout, stderr = process.communicate(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            self._kill(process)
+            process.communicate()
+            raise
+        return subprocess.CompletedProcess(command, process.returncode, stdout, stderr)
+    
+    def _kill(self, process: subprocess.Popen):
+        """Kill a program along with everything in its session"""
+        try:
+            if os.getpgid(process.pid) == process.pid:
+                os.killpg(process.pid, signal.SIGKILL)
+                return
+        except ProcessLookupError:
+            return
+        process.kill()
+    
+    def execute_code(self, code: str, language: str, input_data: str = "",
+                     timeout: Optional[int] = None, max_memory: Optional[int] = None) -> Dict[str, Any]:
         """Execute code in the specified language
         
         Args:
             code: The code to execute
             language: Programming language
             input_data: Input to provide to the program
+            timeout: Maximum execution time in seconds for this run, if not the executor's
+            max_memory: Maximum memory usage in MB for this run, if not the executor's
             
         Returns:
             Dictionary with output, error, execution time, and status
@@ -187,20 +757,85 @@ class CodeExecutor:
                 'status': 'validation_error'
             }
         
-        return self._execute_with_subprocess(code, language, input_data)
+        limits = (
+            timeout if timeout is not None else self.timeout,
+            max_memory * 1024 * 1024 if max_memory is not None else self.max_memory
+        )
+        
+        # Workers run under the executor's limits; a shorter timeout is still
+        # enforced by the deadline, anything else needs a fresh process
+        worker = None
+        if limits[1] == self.max_memory and limits[0] <= self.timeout:
+            worker = self._take_worker(language)
+        if worker is not None:
+            try:
+                return self._execute_with_worker(worker, code, input_data, limits[0])
+            finally:
+                # Replace the used worker only once the run is over so the new
+                # interpreter's startup does not compete with it for CPU
+                self._replenish_worker(language)
+        
+        return self._execute_with_subprocess(code, language, input_data, limits)
+    
+    def execute_code_async(self, code: str, language: str, input_data: str = "",
+                           timeout: Optional[int] = None, max_memory: Optional[int] = None) -> Future:
+        """Schedule execute_code on the executor's bounded thread pool
+        
+        Returns:
+            Future resolving to the execute_code result dictionary
+        """
+        return self._exec_pool.submit(self.execute_code, code, language, input_data, timeout, max_memory)
     
-    def _execute_with_subprocess(self, code: str, language: str, input_data: str) -> Dict[str, Any]:
-        """Execute code using subprocess with security measures"""
+    def _execute_with_worker(self, worker: Tuple[subprocess.Popen, str], code: str,
+                             input_data: str, timeout: int) -> Dict[str, Any]:
+        """Execute code on a pre-spawned interpreter worker"""
+        process, workdir = worker
+        start_time = time.time()
+        
+        try:
+            source = code.encode('utf-8')
+            payload = b'%d\n' % len(source) + source + input_data.encode('utf-8')
+            stdout, stderr, truncated = self._communicate(process, payload, timeout)
+            return self._run_result(process, stdout, stderr, truncated, start_time, timeout)
+            
+        except subprocess.TimeoutExpired:
+            return {
+                'output': '',
+                'error': f'Execution timed out after {timeout} seconds',
+                'execution_time': timeout,
+                'status': 'timeout'
+            }
+        except Exception as e:
+            if process.poll() is None:
+                self._kill(process)
+            return {
+                'output': '',
+                'error': f'Execution error: {str(e)}',
+                'execution_time': time.time() - start_time,
+                'status': 'error'
+            }
+        finally:
+            self._release_workdir(workdir)
+    
+    def _execute_with_subprocess(self, code: str, language: str, input_data: str,
+                                 limits: Tuple[int, int]) -> Dict[str, Any]:
+        """Execute code using subprocess with security measures
+        
+        Args:
+            limits: (timeout seconds, memory bytes) for this run
+        """
+        timeout = limits[0]
         config = self.language_config[language]
         temp_dir = None
+        artifacts = ()
         
         try:
-            # Create temporary directory
-            temp_dir = tempfile.mkdtemp()
+            # Take a working directory from the pool
+            temp_dir = self._acquire_workdir()
             
             # For Java, extract class name and use it as filename
             if language == 'java':
-                class_match = re.search(r'public\s+class\s+(\w+)', code)
+                class_match = _JAVA_CLASS_RE.search(code)
                 if class_match:
                     class_name = class_match.group(1)
                     file_path = os.path.join(temp_dir, f'{class_name}.java')
@@ -215,31 +850,47 @@ class CodeExecutor:
                 # For other languages, use default filename
                 file_path = os.path.join(temp_dir, f'main{config["extension"]}')
             
-            # Write code to file
-            with open(file_path, 'w', encoding='utf-8') as f:
-                f.write(code)
+            # Interpreted languages take small sources inline (-c/-e), which
+            # skips writing the file; everything else is written to disk
+            inline = (
+                'inline_flag' in config
+                and '\0' not in code
+                and len(code.encode('utf-8')) <= MAX_INLINE_SOURCE_BYTES
+            )
+            if not inline:
+                self._write_source(file_path, code)
+            
+            # Files the run is expected to leave behind, for the cleanup fast path
+            if not config.get('needs_compile', False):
+                artifacts = () if inline else (file_path,)
+            elif language == 'java':
+                artifacts = (file_path, os.path.splitext(file_path)[0] + '.class')
+            else:
+                artifacts = (file_path, os.path.join(temp_dir, os.path.basename(config['command'][0])))
             
             start_time = time.time()
             
             # Compile if needed
             if config.get('needs_compile', False):
-                compile_cmd = config['compile_command'] + [file_path]
-                compile_result = subprocess.run(
-                    compile_cmd,
-                    cwd=temp_dir,
-                    capture_output=True,
-                    text=True,
-                    timeout=self.timeout,
-                    preexec_fn=self._set_resource_limits
-                )
+                compile_cmd = self._resolve_command(config['compile_command'])
+                if compile_cmd is None:
+                    return self._missing_toolchain(config['compile_command'][0], start_time)
                 
-                if compile_result.returncode != 0:
-                    return {
-                        'output': '',
-                        'error': f'Compilation error: {compile_result.stderr}',
-                        'execution_time': time.time() - start_time,
-                        'status': 'compilation_error'
-                    }
+                # Reruns of the same source reuse the cached build
+                build_key = self._build_key(code, language, compile_cmd[0])
+                if not self._restore_build(build_key, temp_dir):
+                    compile_cmd, preexec_fn = self._with_limits(compile_cmd + [file_path], temp_dir, limits)
+                    compile_result = self._compile(compile_cmd, temp_dir, preexec_fn, timeout)
+                    
+                    if compile_result.returncode != 0:
+                        return {
+                            'output': '',
+                            'error': f"Compilation error: {compile_result.stderr[:MAX_OUTPUT_BYTES].decode('utf-8', 'replace')}",
+                            'execution_time': time.time() - start_time,
+                            'status': 'compilation_error'
+                        }
+                    
+                    self._store_build(build_key, temp_dir, file_path)
             
             # Run the code
             if config.get('needs_compile', False):
@@ -247,33 +898,31 @@ class CodeExecutor:
                     run_cmd = config['command'] + [os.path.splitext(os.path.basename(file_path))[0]]
                 else:
                     run_cmd = config['command']
+            elif inline:
+                run_cmd = config['command'] + [config['inline_flag'], code]
             else:
                 run_cmd = config['command'] + [file_path]
             
-            result = subprocess.run(
+            resolved_cmd = self._resolve_command(run_cmd)
+            if resolved_cmd is None:
+                return self._missing_toolchain(run_cmd[0], start_time)
+            run_cmd, preexec_fn = self._with_limits(resolved_cmd, temp_dir, limits)
+            
+            process = subprocess.Popen(
                 run_cmd,
-                cwd=temp_dir,
-                input=input_data,
-                capture_output=True,
-                text=True,
-                timeout=self.timeout,
-                preexec_fn=self._set_resource_limits
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                **self._spawn_options(temp_dir, preexec_fn)
             )
-            
-            execution_time = time.time() - start_time
-            
-            return {
-                'output': result.stdout,
-                'error': result.stderr,
-                'execution_time': execution_time,
-                'status': 'success' if result.returncode == 0 else 'error'
-            }
+            stdout, stderr, truncated = self._communicate(process, input_data.encode('utf-8'), timeout)
+            return self._run_result(process, stdout, stderr, truncated, start_time, timeout)
             
         except subprocess.TimeoutExpired:
             return {
                 'output': '',
-                'error': f'Execution timed out after {self.timeout} seconds',
-                'execution_time': self.timeout,
+                'error': f'Execution timed out after {timeout} seconds',
+                'execution_time': timeout,
                 'status': 'timeout'
             }
         except Exception as e:
@@ -284,12 +933,179 @@ class CodeExecutor:
                 'status': 'error'
             }
         finally:
-            # Clean up temporary directory
-            if temp_dir and os.path.exists(temp_dir):
-                try:
-                    shutil.rmtree(temp_dir)
-                except Exception as e:
-                    logger.error(f"Error cleaning up temporary directory: {str(e)}")
+            # Reset the working directory and hand it back to the pool
+            if temp_dir:
+                self._release_workdir(temp_dir, artifacts)
+    
+    def _communicate(self, process: subprocess.Popen, input_bytes: bytes,
+                     timeout: Optional[int] = None) -> Tuple[bytes, bytes, bool]:
+        """Feed stdin and collect output under the timeout and output cap
+        
+        Unlike Popen.communicate, output is read incrementally into bounded
+        buffers and the process is killed as soon as a stream overflows, so a
+        runaway program cannot exhaust the server's memory.
+        
+        Returns:
+            Tuple of (stdout, stderr, truncated)
+        
+        Raises:
+            subprocess.TimeoutExpired: If the process outlives the timeout
+        """
+        timeout = timeout if timeout is not None else self.timeout
+        deadline = time.monotonic() + timeout
+        buffers = [self._acquire_buffer(), self._acquire_buffer()]
+        views = {process.stdout: memoryview(buffers[0]), process.stderr: memoryview(buffers[1])}
+        try:
+            filled = {process.stdout: 0, process.stderr: 0}
+            truncated = self._pump(process, input_bytes, views, filled, deadline, timeout)
+            # A program can close its output streams and keep running
+            try:
+                process.wait(timeout=max(0, deadline - time.monotonic()))
+            except subprocess.TimeoutExpired:
+                self._kill(process)
+                process.wait()
+                raise
+            return (
+                bytes(views[process.stdout][:filled[process.stdout]]),
+                bytes(views[process.stderr][:filled[process.stderr]]),
+                truncated
+            )
+        finally:
+            for view in views.values():
+                view.release()
+            for buffer in buffers:
+                self._release_buffer(buffer)
+    
+    def _pump(self, process: subprocess.Popen, input_bytes: bytes, views: Dict[Any, memoryview],
+              filled: Dict[Any, int], deadline: float, timeout: int) -> bool:
+        """Run the select loop for _communicate; returns True on overflow"""
+        pending = memoryview(input_bytes)
+        truncated = False
+        
+        with selectors.DefaultSelector() as selector:
+            for stream in views:
+                selector.register(stream, selectors.EVENT_READ)
+            if pending:
+                os.set_blocking(process.stdin.fileno(), False)
+                selector.register(process.stdin, selectors.EVENT_WRITE)
+            else:
+                process.stdin.close()
+            
+            while selector.get_map() and not truncated:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._kill(process)
+                    process.wait()
+                    raise subprocess.TimeoutExpired(process.args, timeout)
+                
+                for key, _ in selector.select(remaining):
+                    stream = key.fileobj
+                    if stream is process.stdin:
+                        try:
+                            pending = pending[os.write(key.fd, pending):]
+                        except BrokenPipeError:
+                            # Program exited without reading all of its input
+                            pending = pending[:0]
+                        if not pending:
+                            selector.unregister(stream)
+                            stream.close()
+                        continue
+                    
+                    # Read straight into the pooled buffer, no per-chunk bytes
+                    count = os.readv(key.fd, [views[stream][filled[stream]:]])
+                    if not count:
+                        selector.unregister(stream)
+                        stream.close()
+                        continue
+                    filled[stream] += count
+                    if filled[stream] > MAX_OUTPUT_BYTES:
+                        filled[stream] = MAX_OUTPUT_BYTES
+                        truncated = True
+                        self._kill(process)
+                        break
+            
+            for key in list(selector.get_map().values()):
+                key.fileobj.close()
+        
+        return truncated
+    
+    def _acquire_buffer(self) -> bytearray:
+        """Take an output buffer from the pool, allocating one if it is empty"""
+        self._buffers_used_at = time.monotonic()
+        try:
+            return self._buffer_pool.get_nowait()
+        except queue.Empty:
+            pass
+        if self._buffer_reaper is None:
+            self._buffer_reaper = threading.Thread(target=self._reap_buffers, daemon=True)
+            self._buffer_reaper.start()
+        # One spare byte so a full buffer signals overflow
+        return bytearray(MAX_OUTPUT_BYTES + 1)
+    
+    def _release_buffer(self, buffer: bytearray):
+        """Return an output buffer to the pool"""
+        if self._buffer_pool.qsize() < self._buffer_pool_size:
+            self._buffer_pool.put(buffer)
+    
+    def _reap_buffers(self):
+        """Free pooled output buffers after BUFFER_IDLE_SECONDS without runs"""
+        while True:
+            time.sleep(BUFFER_IDLE_SECONDS)
+            if time.monotonic() - self._buffers_used_at < BUFFER_IDLE_SECONDS:
+                continue
+            try:
+                while True:
+                    self._buffer_pool.get_nowait()
+            except queue.Empty:
+                pass
+    
+    def _run_result(self, process: subprocess.Popen, stdout: bytes, stderr: bytes,
+                    truncated: bool, start_time: float, timeout: int) -> Dict[str, Any]:
+        """Build the result dictionary for a finished run"""
+        # Killed by SIGXCPU at the CPU limit: directly, or propagated by bwrap
+        # as 128 + signal
+        if process.returncode in (-signal.SIGXCPU, 128 + signal.SIGXCPU):
+            return {
+                'output': stdout.decode('utf-8', 'replace'),
+                'error': f'Execution timed out after {timeout} seconds',
+                'execution_time': time.time() - start_time,
+                'status': 'timeout'
+            }
+        result = {
+            'output': stdout.decode('utf-8', 'replace'),
+            'error': stderr.decode('utf-8', 'replace'),
+            'execution_time': time.time() - start_time,
+            'status': 'success' if process.returncode == 0 else 'error',
+            'exit_code': process.returncode
+        }
+        if truncated:
+            result['error'] += f'\nOutput limit of {MAX_OUTPUT_BYTES} bytes exceeded; execution stopped'
+            result['truncated'] = True
+        return result
+    
+    def _write_source(self, file_path: str, code: str):
+        """Write the source file with raw fd writes (no buffered text layer)"""
+        data = memoryview(code.encode('utf-8'))
+        fd = os.open(file_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        try:
+            size = len(data)
+            while data:
+                data = data[os.write(fd, data):]
+            # Keep the pages cached for the compiler's read right after (a
+            # no-op on tmpfs, but saves a cold read when workdirs are on disk)
+            if hasattr(os, 'posix_fadvise'):
+                os.posix_fadvise(fd, 0, size, os.POSIX_FADV_WILLNEED)
+        finally:
+            os.close(fd)
+    
+    def _missing_toolchain(self, name: str, start_time: float) -> Dict[str, Any]:
+        """Build the result returned when a runtime is not installed"""
+        return {
+            'output': '',
+            'error': f'Runtime not available on this server: {name}',
+            'execution_time': time.time() - start_time,
+            'status': 'error'
+        }
     
     def validate_code(self, code: str, language: str) -> Dict[str, Any]:
         """Validate code for syntax errors and security
@@ -337,4 +1153,14 @@ class CodeExecutor:
             return code
         except Exception as e:
             logger.error(f"Error formatting code: {str(e)}")
-            return code 
\ No newline at end of file
+            return code 
+
+
+@functools.lru_cache(maxsize=None)
+def get_executor(timeout: int = 30, max_memory: int = 512) -> CodeExecutor:
+    """Get the process-wide executor for the given limits
+    
+    Executors own worker pools and directories, so callers should share one
+    instead of constructing a new executor per request.
+    """
+    return CodeExecutor(timeout=timeout, max_memory=max_memory)
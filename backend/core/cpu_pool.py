@@ -0,0 +1,18 @@
+"""
+Thread pool for CPU-bound work (e.g. ranking the RAG index), kept apart from
+the event loop's default executor so blocking I/O handed to asyncio.to_thread
+never queues behind it
+"""
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+# One thread per core; the NumPy/faiss kernels release the GIL
+cpu_executor = ThreadPoolExecutor(max_workers=os.cpu_count() or 1, thread_name_prefix='cpu')
+
+async def run_cpu(func: Callable[..., Any], *args: Any) -> Any:
+    """Run func(*args) on the CPU pool and await its result"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(cpu_executor, functools.partial(func, *args))
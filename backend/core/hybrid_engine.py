@@ -2,22 +2,118 @@
 Hybrid Code Understanding Engine combining RAG, CodeBERT, and Tree-sitter
 """
 import os
-from typing import List, Dict, Any, Optional, Set
+from typing import AsyncIterator, List, Dict, Any, Optional, Set, Tuple
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
 import google.generativeai as genai
 from transformers import AutoTokenizer, AutoModel
 import torch
 from tree_sitter import Language, Parser
 import json
 import logging
+import threading
+import queue
+import hashlib
+import base64
+import heapq
+from operator import itemgetter
+from collections import OrderedDict
 from concurrent.futures import ThreadPoolExecutor
-import tempfile
-import shutil
+import subprocess
+import asyncio
+from core.cpu_pool import run_cpu
+try:
+    import faiss
+    HAS_FAISS = True
+except ImportError:
+    HAS_FAISS = False
+try:
+    from sentence_transformers import SentenceTransformer
+    HAS_SENTENCE_TRANSFORMERS = True
+except ImportError:
+    HAS_SENTENCE_TRANSFORMERS = False
 
 logger = logging.getLogger(__name__)
 
+# Number of code strings per CodeBERT forward pass
+CODEBERT_BATCH_SIZE = 32
+
+# Token ids are small next to embeddings, so more of them are kept; a
+# re-embed of an evicted file then skips tokenization
+TOKEN_CACHE_FACTOR = 4
+
+# Gemini embedding model and texts per batch embedding request (the API maximum)
+EMBEDDING_MODEL = 'models/embedding-001'
+EMBEDDING_BATCH_SIZE = 100
+
+# In-process model for the 'local' embedding backend, and the instruction BGE
+# models expect in front of search queries (documents are embedded as-is)
+LOCAL_EMBEDDING_MODEL = 'BAAI/bge-small-en-v1.5'
+LOCAL_QUERY_INSTRUCTION = 'Represent this sentence for searching relevant passages: '
+
+# Cosine similarity above which a cached answer is reused for a new query,
+# and cached answers kept per retrieved context
+RESPONSE_CACHE_THRESHOLD = 0.95
+RESPONSE_CACHE_PER_SCOPE = 32
+
+# Cached search_code result lists
+SEARCH_CACHE_SIZE = 1024
+
+# Rows of an int8 search index dequantized per matrix product while searching
+QUANTIZED_SEARCH_BLOCK = 8192
+
+# Grammar repositories, each compiled into its own library on first use
+TREE_SITTER_GRAMMARS = {
+    'python': 'https://github.com/tree-sitter/tree-sitter-python',
+    'javascript': 'https://github.com/tree-sitter/tree-sitter-javascript',
+    'java': 'https://github.com/tree-sitter/tree-sitter-java',
+    'cpp': 'https://github.com/tree-sitter/tree-sitter-cpp'
+}
+
+# Tree-sitter query patterns for the structures reported by _analyze_ast.
+# Grammars name their nodes differently, so each language keeps only the
+# patterns its grammar defines.
+AST_QUERY_PATTERNS = (
+    '(function_definition name: (identifier) @function.name) @function',
+    '(function_declaration name: (identifier) @function.name) @function',
+    '(method_declaration name: (identifier) @function.name) @function',
+    '(function_definition declarator: (function_declarator declarator: (identifier) @function.name)) @function',
+    '(class_definition name: (identifier) @class.name) @class',
+    '(class_declaration name: (identifier) @class.name) @class',
+    '(class_specifier name: (type_identifier) @class.name) @class',
+    '(if_statement) @control',
+    '(for_statement) @control',
+    '(while_statement) @control',
+)
+
+# ast_info list filled by each definition capture
+AST_CAPTURE_KEYS = {'function': 'functions', 'class': 'classes'}
+
+def _content_key(text: str) -> bytes:
+    """Fixed-size cache key for a (possibly large) source string"""
+    return _digest(text.encode('utf8'))
+
+def _digest(data: bytes) -> bytes:
+    """16-byte BLAKE2b digest used for cache keys"""
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+def _quantize(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Symmetric per-vector int8 scalar quantization; returns (codes, scales)"""
+    scales = np.maximum(np.abs(vectors).max(axis=1), 1e-12) / 127
+    codes = np.clip(np.round(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+def _normalize(vector: np.ndarray) -> np.ndarray:
+    """float32 unit vector (zero vectors stay zero)"""
+    vector = np.asarray(vector, dtype=np.float32)
+    return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
 class HybridEngine:
+    # Grammars and compiled queries shared by every engine in the process
+    _ts_languages: Dict[str, Language] = {}
+    _ts_queries: Dict[str, Any] = {}
+    _ts_failed: Set[str] = set()  # Grammars whose build failed
+    _tree_sitter_lock = threading.Lock()
+    
     def __init__(self, api_key: str):
         """Initialize hybrid engine with all components"""
         self.api_key = api_key
@@ -25,123 +121,310 @@ class HybridEngine:
         # Initialize RAG component
         self.rag = RAGEngine(api_key=api_key)
         
-        # Initialize CodeBERT with error handling
+        # Initialize CodeBERT with error handling; it runs on the GPU when present
+        self.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
         try:
             self.codebert_tokenizer = AutoTokenizer.from_pretrained("microsoft/codebert-base")
             self.codebert_model = AutoModel.from_pretrained("microsoft/codebert-base")
             self.codebert_model.eval()  # Set to evaluation mode
+            if self.device.type == 'cuda':
+                # Half precision on the GPU
+                self.codebert_model = self.codebert_model.to(self.device).half()
+            else:
+                # int8 dynamic quantization of the Linear layers for CPU
+                # inference; embeddings still come out as float32
+                self.codebert_model = torch.quantization.quantize_dynamic(
+                    self.codebert_model, {torch.nn.Linear}, dtype=torch.qint8
+                )
+            # Compile the forward graph (fused kernels, no per-op Python
+            # dispatch); the eager model is kept in case compilation fails
+            self._codebert_eager = self.codebert_model
+            if hasattr(torch, 'compile'):
+                try:
+                    self.codebert_model = torch.compile(self.codebert_model, dynamic=True)
+                except Exception as e:
+                    # e.g. Dynamo unsupported on this Python; eager still works
+                    logger.warning(f"torch.compile unavailable, using eager CodeBERT: {str(e)}")
+            # Inter-op parallelism only oversubscribes cores alongside the
+            # request threads; intra-op threads still parallelise each batch
+            try:
+                torch.set_num_interop_threads(1)
+            except RuntimeError:
+                pass  # Already set by an earlier engine in this process
         except Exception as e:
             logger.error(f"Failed to load CodeBERT model: {str(e)}")
             self.codebert_tokenizer = None
             self.codebert_model = None
+            self._codebert_eager = None
+        
+        # Serialize CodeBERT forwards: concurrent CPU forwards fight over the
+        # same cores, so one batch runs at a time (a few on GPU)
+        use_cuda = self.device.type == 'cuda'
+        concurrent_forwards = 4 if use_cuda else 1
+        self._embed_semaphore = threading.Semaphore(concurrent_forwards)
+        
+        # One reusable (batch, 512) input tensor pair per concurrent forward,
+        # pinned on GPU hosts so host-to-device copies can run asynchronously
+        self._input_buffers: queue.LifoQueue = queue.LifoQueue()
+        for _ in range(concurrent_forwards):
+            self._input_buffers.put(tuple(
+                torch.zeros((CODEBERT_BATCH_SIZE, 512), dtype=torch.long, pin_memory=use_cuda)
+                for _ in range(2)
+            ))
         
-        # Initialize Tree-sitter
-        self.parser = Parser()
-        self.languages = {}
+        # Initialize Tree-sitter (one parser per thread, see _parser)
+        self._local = threading.local()
         self._initialize_tree_sitter()
         
         # Initialize thread pool for parallel processing
         self.executor = ThreadPoolExecutor(max_workers=4)
         
         # Cache for frequently accessed results with size limits
+        # (OrderedDicts in least-recently-used-first order)
         self.cache = {
-            'codebert_embeddings': {},
-            'ast_analysis': {},
-            'combined_results': {}
+            'codebert_embeddings': OrderedDict(),
+            'codebert_tokens': OrderedDict(),
+            'ast_analysis': OrderedDict(),
+            'ast_complexity': OrderedDict(),
+            'combined_results': OrderedDict()
         }
         self.max_cache_size = 1000  # Maximum number of items per cache
+        self._cache_lock = threading.RLock()  # Caches are shared with executor threads
+        
+        # CodeBERT embeddings live in one contiguous matrix; the
+        # 'codebert_embeddings' cache maps a content key to its row
+        self._embedding_matrix = np.zeros((self.max_cache_size, 768), dtype=np.float32)
+        self._free_rows = list(range(self.max_cache_size - 1, -1, -1))
     
     def _initialize_tree_sitter(self):
         """Initialize Tree-sitter with language support"""
-        try:
-            # Create temporary directory for language files
-            temp_dir = tempfile.mkdtemp()
-            language_path = os.path.join(temp_dir, 'my-languages.so')
-            
-            # Download and build language library
-            Language.build_library(
-                language_path,
-                [
-                    'https://github.com/tree-sitter/tree-sitter-python',
-                    'https://github.com/tree-sitter/tree-sitter-javascript',
-                    'https://github.com/tree-sitter/tree-sitter-java',
-                    'https://github.com/tree-sitter/tree-sitter-cpp'
-                ]
-            )
-            
-            # Load languages
-            PY_LANGUAGE = Language(language_path, 'python')
-            JS_LANGUAGE = Language(language_path, 'javascript')
-            JAVA_LANGUAGE = Language(language_path, 'java')
-            CPP_LANGUAGE = Language(language_path, 'cpp')
-            
-            self.languages = {
-                'python': PY_LANGUAGE,
-                'javascript': JS_LANGUAGE,
-                'java': JAVA_LANGUAGE,
-                'cpp': CPP_LANGUAGE
-            }
-            
-            # Clean up temporary directory
-            shutil.rmtree(temp_dir)
+        # Grammars are built on first use of each language (see _language)
+        # and shared by every engine in the process
+        self.languages = HybridEngine._ts_languages
+        self.queries = HybridEngine._ts_queries
+    
+    def _language(self, name: str) -> Optional[Language]:
+        """Grammar for a language, building it on first use (None if unsupported)"""
+        language = self.languages.get(name)
+        if language is not None or name not in TREE_SITTER_GRAMMARS:
+            return language
+        
+        with HybridEngine._tree_sitter_lock:
+            if name in self.languages:
+                return self.languages[name]
+            if name in HybridEngine._ts_failed:
+                return None
+            try:
+                language = self._build_language(name)
+                # Compile the structure query once per language
+                self.queries[name] = self._build_query(language)
+                self.languages[name] = language
+                return language
+            except Exception as e:
+                logger.error(f"Error initializing Tree-sitter for {name}: {str(e)}")
+                HybridEngine._ts_failed.add(name)  # Don't retry the build on every call
+                return None
+    
+    def _build_language(self, name: str) -> Language:
+        """Load one grammar, building it into the user cache on first use"""
+        cache_dir = os.path.join(
+            os.environ.get('XDG_CACHE_HOME', os.path.expanduser('~/.cache')), 'devsensei'
+        )
+        language_path = os.path.join(cache_dir, f'ts-{name}.so')
+        
+        if not os.path.exists(language_path):
+            # Download the grammar source (kept for rebuilds) and build it
+            repo_path = os.path.join(cache_dir, 'grammars', f'tree-sitter-{name}')
+            if not os.path.isdir(repo_path):
+                subprocess.run(
+                    ['git', 'clone', '--depth', '1', TREE_SITTER_GRAMMARS[name], repo_path],
+                    check=True,
+                    capture_output=True
+                )
             
+            # Build under a private name so other processes never load a
+            # partially written library
+            build_path = f'{language_path}.{os.getpid()}.tmp'
+            Language.build_library(build_path, [repo_path])
+            os.replace(build_path, language_path)
+        
+        return Language(language_path, name)
+    
+    def _build_query(self, language: Language):
+        """Compile the AST_QUERY_PATTERNS that language's grammar supports"""
+        patterns = []
+        for pattern in AST_QUERY_PATTERNS:
+            try:
+                language.query(pattern)
+            except Exception:
+                continue  # Node type or field not in this grammar
+            patterns.append(pattern)
+        return language.query('\n'.join(patterns))
+    
+    def _parser(self) -> Parser:
+        """Tree-sitter parser for the calling thread (parsers are not thread-safe)"""
+        parser = getattr(self._local, 'parser', None)
+        if parser is None:
+            parser = self._local.parser = Parser()
+        return parser
+    
+    def _clean_cache(self, cache_type: str, max_size: Optional[int] = None):
+        """Clean cache if it exceeds size limit (max_cache_size by default)"""
+        max_size = max_size or self.max_cache_size
+        with self._cache_lock:
+            cache = self.cache[cache_type]
+            while len(cache) > max_size:
+                # Remove least recently used items
+                cache.popitem(last=False)
+    
+    def _cache_lookup(self, cache_type: str, key: Any) -> Any:
+        """Return a cached value and mark it recently used, or None on a miss"""
+        with self._cache_lock:
+            cache = self.cache[cache_type]
+            value = cache.get(key)
+            if value is not None:
+                cache.move_to_end(key)
+            return value
+    
+    def _store_embedding(self, key: bytes, embedding: np.ndarray):
+        """Write an embedding into a free matrix row, evicting the LRU row if full"""
+        with self._cache_lock:
+            cache = self.cache['codebert_embeddings']
+            if key in cache:
+                row = cache[key]
+                cache.move_to_end(key)
+            elif self._free_rows:
+                row = self._free_rows.pop()
+            else:
+                _, row = cache.popitem(last=False)
+            self._embedding_matrix[row] = embedding
+            cache[key] = row
+    
+    def _codebert_forward(self, inputs: Dict[str, Any]):
+        """Run CodeBERT, falling back to eager mode if the compiled graph fails"""
+        try:
+            return self.codebert_model(**inputs)
         except Exception as e:
-            logger.error(f"Error initializing Tree-sitter: {str(e)}")
-            self.languages = {}
+            if self.codebert_model is self._codebert_eager:
+                raise
+            logger.error(f"Compiled CodeBERT failed, using eager mode: {str(e)}")
+            self.codebert_model = self._codebert_eager
+            return self.codebert_model(**inputs)
     
-    def _clean_cache(self, cache_type: str):
-        """Clean cache if it exceeds size limit"""
-        if len(self.cache[cache_type]) > self.max_cache_size:
-            # Remove oldest items
-            items_to_remove = len(self.cache[cache_type]) - self.max_cache_size
-            for _ in range(items_to_remove):
-                self.cache[cache_type].pop(next(iter(self.cache[cache_type])))
+    def _tokenize(self, codes: List[str], keys: Dict[str, bytes]) -> List[np.ndarray]:
+        """Token ids for each code string, tokenizing only those not stored yet"""
+        tokens = {code: self._cache_lookup('codebert_tokens', keys[code]) for code in codes}
+        fresh = [code for code, ids in tokens.items() if ids is None]
+        if fresh:
+            encoded = self.codebert_tokenizer(fresh, truncation=True, max_length=512)['input_ids']
+            with self._cache_lock:
+                for code, ids in zip(fresh, encoded):
+                    tokens[code] = np.asarray(ids, dtype=np.int64)
+                    self.cache['codebert_tokens'][keys[code]] = tokens[code]
+                self._clean_cache('codebert_tokens', TOKEN_CACHE_FACTOR * self.max_cache_size)
+        return [tokens[code] for code in codes]
+    
+    def _pad_tokens(self, token_ids: List[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+        """Right-pad token id arrays into an (input_ids, attention_mask) batch"""
+        length = max(len(ids) for ids in token_ids)
+        input_ids = np.full((len(token_ids), length), self.codebert_tokenizer.pad_token_id, dtype=np.int64)
+        attention_mask = np.zeros((len(token_ids), length), dtype=np.int64)
+        for row, ids in enumerate(token_ids):
+            input_ids[row, :len(ids)] = ids
+            attention_mask[row, :len(ids)] = 1
+        return input_ids, attention_mask
+    
+    def _embed_tokens(self, input_ids: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
+        """Run one CodeBERT batch and return its [CLS] embeddings as float32
+        
+        Token arrays are copied into a preallocated input buffer pair, so the
+        input tensors are reused rather than allocated for every batch.
+        """
+        rows, length = input_ids.shape
+        with self._embed_semaphore:
+            ids_buffer, mask_buffer = self._input_buffers.get()
+            try:
+                ids = ids_buffer[:rows, :length]
+                mask = mask_buffer[:rows, :length]
+                ids.copy_(torch.from_numpy(input_ids))
+                mask.copy_(torch.from_numpy(attention_mask))
+                inputs = {
+                    'input_ids': ids.to(self.device, non_blocking=True),
+                    'attention_mask': mask.to(self.device, non_blocking=True)
+                }
+                with torch.inference_mode():
+                    outputs = self._codebert_forward(inputs)
+                
+                # Use [CLS] token embedding as code representation; copying it
+                # back also waits for the forward, so the buffers are free again
+                return outputs.last_hidden_state[:, 0].float().cpu().numpy()
+            finally:
+                self._input_buffers.put((ids_buffer, mask_buffer))
     
     def _get_codebert_embedding(self, code: str) -> np.ndarray:
         """Get CodeBERT embedding for code"""
+        return self._get_codebert_embeddings([code])[0]
+    
+    def _get_codebert_embeddings(self, codes: List[str]) -> List[np.ndarray]:
+        """Get CodeBERT embeddings for several code strings
+        
+        Cache misses are embedded together in batches of CODEBERT_BATCH_SIZE,
+        sorted by length so each batch pads as little as possible.
+        """
         try:
             # Check if CodeBERT is available
             if self.codebert_model is None or self.codebert_tokenizer is None:
                 logger.warning("CodeBERT model not available")
-                return np.zeros(768)
+                return [np.zeros(768) for _ in codes]
             
             # Check cache
-            if code in self.cache['codebert_embeddings']:
-                return self.cache['codebert_embeddings'][code]
+            keys = {code: _content_key(code) for code in codes}
+            embeddings = {}
+            with self._cache_lock:  # Rows may be reused once the lock is released
+                for code, key in keys.items():
+                    row = self._cache_lookup('codebert_embeddings', key)
+                    if row is not None:
+                        embeddings[code] = self._embedding_matrix[row].copy()
+            # Each distinct content is embedded once, however often it repeats
+            missing = sorted((code for code in keys if code not in embeddings), key=len)
             
-            # Tokenize and get embeddings
-            inputs = self.codebert_tokenizer(code, return_tensors="pt", padding=True, truncation=True)
-            with torch.no_grad():
-                outputs = self.codebert_model(**inputs)
-            
-            # Use [CLS] token embedding as code representation
-            embedding = outputs.last_hidden_state[0][0].numpy()
-            
-            # Cache result
-            self.cache['codebert_embeddings'][code] = embedding
-            self._clean_cache('codebert_embeddings')
+            for start in range(0, len(missing), CODEBERT_BATCH_SIZE):
+                batch = missing[start:start + CODEBERT_BATCH_SIZE]
+                
+                # Tokenize (or reuse stored token ids) and get embeddings
+                input_ids, attention_mask = self._pad_tokens(self._tokenize(batch, keys))
+                cls_embeddings = self._embed_tokens(input_ids, attention_mask)
+                for code, embedding in zip(batch, cls_embeddings):
+                    embeddings[code] = embedding
+                    self._store_embedding(keys[code], embedding)
             
-            return embedding
+            return [embeddings[code] for code in codes]
             
         except Exception as e:
             logger.error(f"Error getting CodeBERT embedding: {str(e)}")
-            return np.zeros(768)  # Return zero vector as fallback
+            return [np.zeros(768) for _ in codes]  # Return zero vectors as fallback
     
     def _analyze_ast(self, code: str, language: str) -> Dict[str, Any]:
         """Analyze code using Tree-sitter"""
         try:
+            # Encoded once for both the cache key and the parser
+            source = code.encode('utf8')
+            cache_key = _digest(source) + language.encode('utf8')
+            
             # Check cache
-            cache_key = f"{code}:{language}"
-            if cache_key in self.cache['ast_analysis']:
-                return self.cache['ast_analysis'][cache_key]
+            cached = self._cache_lookup('ast_analysis', cache_key)
+            if cached is not None:
+                return cached
             
-            if language not in self.languages:
+            grammar = self._language(language)
+            if grammar is None:
                 logger.warning(f"Language {language} not supported by Tree-sitter")
                 return {}
             
             # Parse code
-            self.parser.set_language(self.languages[language])
-            tree = self.parser.parse(bytes(code, 'utf8'))
+            parser = self._parser()
+            parser.set_language(grammar)
+            tree = parser.parse(source)
             
             # Extract AST information
             ast_info = {
@@ -152,35 +435,35 @@ class HybridEngine:
                 'control_structures': []
             }
             
-            # Traverse AST
-            def traverse_node(node):
-                if node.type == 'function_definition':
-                    ast_info['functions'].append({
-                        'name': node.child_by_field_name('name').text.decode('utf8'),
+            # Run the compiled query; matching happens in C and captures come
+            # back in document order, so a definition precedes its name
+            for node, capture in self.queries[language].captures(tree.root_node):
+                if capture == 'control':
+                    ast_info['control_structures'].append({
+                        'type': node.type,
                         'start_line': node.start_point[0],
                         'end_line': node.end_point[0]
                     })
-                elif node.type == 'class_definition':
-                    ast_info['classes'].append({
-                        'name': node.child_by_field_name('name').text.decode('utf8'),
+                elif capture in AST_CAPTURE_KEYS:
+                    ast_info[AST_CAPTURE_KEYS[capture]].append({
+                        'name': None,
                         'start_line': node.start_point[0],
                         'end_line': node.end_point[0]
                     })
-                elif node.type in ['if_statement', 'for_statement', 'while_statement']:
-                    ast_info['control_structures'].append({
-                        'type': node.type,
-                        'start_line': node.start_point[0],
-                        'end_line': node.end_point[0]
-                    })
-                
-                for child in node.children:
-                    traverse_node(child)
-            
-            traverse_node(tree.root_node)
+                else:
+                    # '<kind>.name' belongs to the most recent definition of that kind
+                    entries = ast_info[AST_CAPTURE_KEYS[capture.split('.')[0]]]
+                    entries[-1]['name'] = node.text.decode('utf8')
             
             # Cache result
-            self.cache['ast_analysis'][cache_key] = ast_info
-            self._clean_cache('ast_analysis')
+            with self._cache_lock:
+                self.cache['ast_analysis'][cache_key] = ast_info
+                self._clean_cache('ast_analysis')
+                # The search score's AST term depends only on the file
+                self.cache['ast_complexity'][cache_key] = (
+                    len(ast_info['functions']) + len(ast_info['classes'])
+                ) / 10.0
+                self._clean_cache('ast_complexity')
             
             return ast_info
             
@@ -188,19 +471,30 @@ class HybridEngine:
             logger.error(f"Error analyzing AST: {str(e)}")
             return {}
     
+    def _ast_complexity(self, code: str, language: str) -> float:
+        """AST complexity term of the search score (0 for unsupported languages)"""
+        cache_key = _content_key(code) + language.encode('utf8')
+        complexity = self._cache_lookup('ast_complexity', cache_key)
+        if complexity is None:
+            self._analyze_ast(code, language)
+            complexity = self._cache_lookup('ast_complexity', cache_key)
+        return complexity or 0.0
+    
     def index_code(self, repo_name: str, files: List[Dict[str, str]]) -> None:
         """Index code using all components"""
         try:
             # Index with RAG
             self.rag.index_code(repo_name, files)
             
-            # Process each file with CodeBERT and Tree-sitter
-            for file in files:
-                # Get CodeBERT embedding
-                self._get_codebert_embedding(file['content'])
-                
-                # Analyze AST
-                self._analyze_ast(file['content'], file.get('language', 'python'))
+            # Analyze each file with Tree-sitter on the thread pool while
+            # CodeBERT embeds all files in batched forward passes
+            ast_futures = [
+                self.executor.submit(self._analyze_ast, file['content'], file.get('language', 'python'))
+                for file in files
+            ]
+            self._get_codebert_embeddings([file['content'] for file in files])
+            for future in ast_futures:
+                future.result()
             
             logger.info(f"Indexed {len(files)} files with hybrid engine")
             
@@ -213,50 +507,69 @@ class HybridEngine:
         try:
             # Get results from each component
             rag_results = self.rag.search_code(repo_name, query, k)
+            if not rag_results:
+                return []
             
-            # Get CodeBERT embedding for query
-            query_embedding = self._get_codebert_embedding(query)
-            
-            # Combine and rank results
-            combined_results = []
-            for result in rag_results:
-                # Get CodeBERT similarity
-                code_embedding = self._get_codebert_embedding(result['content'])
-                codebert_similarity = cosine_similarity(
-                    [query_embedding],
-                    [code_embedding]
-                )[0][0]
-                
-                # Get AST analysis
-                ast_info = self._analyze_ast(result['content'], result['language'])
-                
-                # Calculate combined score
-                combined_score = (
-                    0.4 * result['relevance_score'] +  # RAG score
-                    0.4 * codebert_similarity +        # CodeBERT score
-                    0.2 * (len(ast_info['functions']) + len(ast_info['classes'])) / 10  # AST complexity
-                )
-                
-                # Add enhanced result
-                enhanced_result = {
+            # Get CodeBERT embeddings for the query and every result in one batch
+            query_embedding, *code_embeddings = self._get_codebert_embeddings(
+                [query] + [result['content'] for result in rag_results]
+            )
+            
+            # CodeBERT cosine similarity of every result in one matrix-vector product
+            code_matrix = np.stack([_normalize(embedding) for embedding in code_embeddings])
+            codebert_similarities = code_matrix @ _normalize(query_embedding)
+            
+            # AST analysis and complexity (both cached per file)
+            languages = [result.get('language', 'python') for result in rag_results]
+            ast_infos = [
+                self._analyze_ast(result['content'], language)
+                for result, language in zip(rag_results, languages)
+            ]
+            complexities = np.fromiter(
+                (self._ast_complexity(result['content'], language)
+                 for result, language in zip(rag_results, languages)),
+                dtype=np.float32,
+                count=len(rag_results)
+            )
+            rag_scores = np.fromiter(
+                (result['relevance_score'] for result in rag_results),
+                dtype=np.float32,
+                count=len(rag_results)
+            )
+            
+            # Calculate combined scores for all results at once
+            combined_scores = (
+                0.4 * rag_scores +               # RAG score
+                0.4 * codebert_similarities +    # CodeBERT score
+                0.2 * complexities               # AST complexity
+            )
+            
+            # Add enhanced results
+            combined_results = [
+                {
                     **result,
                     'codebert_similarity': float(codebert_similarity),
                     'ast_info': ast_info,
                     'combined_score': float(combined_score)
                 }
-                combined_results.append(enhanced_result)
-            
-            # Sort by combined score
-            combined_results.sort(key=lambda x: x['combined_score'], reverse=True)
+                for result, codebert_similarity, ast_info, combined_score
+                in zip(rag_results, codebert_similarities, ast_infos, combined_scores)
+            ]
             
-            return combined_results[:k]
+            # Top k by combined score
+            return heapq.nlargest(k, combined_results, key=itemgetter('combined_score'))
             
         except Exception as e:
             logger.error(f"Error searching code: {str(e)}")
             return []
     
-    def analyze_code(self, code: str, language: str) -> Dict[str, Any]:
-        """Analyze code using all components"""
+    def analyze_code(self, code: str, language: str, embedding_format: str = 'list') -> Dict[str, Any]:
+        """Analyze code using all components
+        
+        embedding_format 'list' returns codebert_embedding as a list of floats;
+        'packed' returns codebert_embedding_packed instead, the embedding as
+        base64 float16 bytes (decode with np.frombuffer), far smaller in JSON.
+        """
         try:
             # Get CodeBERT embedding
             codebert_embedding = self._get_codebert_embedding(code)
@@ -267,55 +580,194 @@ class HybridEngine:
             # Get RAG analysis (if code is indexed)
             rag_analysis = self.rag.search_code("temp", code, k=1)
             
-            return {
-                'codebert_embedding': codebert_embedding.tolist(),
+            result = {
                 'ast_info': ast_info,
                 'rag_analysis': rag_analysis[0] if rag_analysis else None
             }
+            if embedding_format == 'packed':
+                result['codebert_embedding_packed'] = {
+                    'data': base64.b64encode(codebert_embedding.astype(np.float16).tobytes()).decode('ascii'),
+                    'dtype': 'float16',
+                    'shape': list(codebert_embedding.shape)
+                }
+            else:
+                result['codebert_embedding'] = codebert_embedding.tolist()
+            return result
             
         except Exception as e:
             logger.error(f"Error analyzing code: {str(e)}")
             return {}
 
 class RAGEngine:
-    def __init__(self, api_key: str):
+    def __init__(self, api_key: str, embedding_backend: Optional[str] = None,
+                 quantize_index: Optional[bool] = None):
         """Initialize RAG engine"""
         self.api_key = api_key
         genai.configure(api_key=api_key)
         self.model = genai.GenerativeModel('gemini-pro')
         
-        # Initialize embeddings cache
-        self.embeddings_cache = {}
+        # Embeddings come from Gemini, or from a local sentence-transformers
+        # model when embedding_backend (default: RAG_EMBEDDING_BACKEND) is 'local'
+        self.embedding_backend = embedding_backend or os.getenv('RAG_EMBEDDING_BACKEND', 'gemini')
+        self.embedding_dim = 768
+        self._local_model = None
+        self._local_lock = threading.Lock()  # One encode at a time
+        if self.embedding_backend == 'local':
+            self._load_local_model()
+        
+        # Initialize embeddings cache (least recently used first), keyed by
+        # content digest
+        self.embeddings_cache = OrderedDict()
         self.max_cache_size = 1000
+        self._cache_lock = threading.Lock()
+        
+        # Generated answers per (prompt, retrieved code) scope, as
+        # (normalised query embedding, response) pairs (see generate_with_context)
+        self._response_cache = OrderedDict()
+        
+        # search_code results per (repo_name, query digest, k), cleared
+        # whenever files are added to the index
+        self._search_cache = OrderedDict()
+        
+        # Searches and adds run on worker threads, so every read and write of
+        # the index state below holds _index_lock. _index_generation counts
+        # adds, so a search that ranked against an older index does not cache
+        # its result.
+        self._index_lock = threading.Lock()
+        self._index_generation = 0
+        
+        # Embedding requests are network round-trips, so batches are embedded
+        # concurrently while indexing
+        self.executor = ThreadPoolExecutor(max_workers=8)
+        
+        # Search index over the L2-normalised embeddings of indexed files, so
+        # inner product equals cosine similarity. Uses faiss when installed,
+        # otherwise a NumPy matrix. With quantize_index (default:
+        # RAG_INDEX_QUANTIZATION=int8) the NumPy matrix holds int8 codes with
+        # a scale per vector instead, a quarter of the float32 memory.
+        if quantize_index is None:
+            quantize_index = os.getenv('RAG_INDEX_QUANTIZATION') == 'int8'
+        self.quantize_index = quantize_index
+        self.index = None
+        self.index_contents: List[str] = []
+        self._indexed_keys: Set[bytes] = set()
+        self._index_vectors: List[np.ndarray] = []  # Row blocks, one per add
+        self._index_scales: List[np.ndarray] = []  # int8 only, one per block
+        self._index_matrix: Optional[np.ndarray] = None
+        self._index_scale_vector: Optional[np.ndarray] = None
     
-    def _get_embedding(self, text: str) -> np.ndarray:
-        """Get embedding for text using Gemini"""
+    def _load_local_model(self):
+        """Load the local embedding model, falling back to Gemini embeddings"""
+        if not HAS_SENTENCE_TRANSFORMERS:
+            logger.warning("sentence-transformers not installed, using Gemini embeddings")
+            self.embedding_backend = 'gemini'
+            return
         try:
-            # Check cache
-            if text in self.embeddings_cache:
-                return self.embeddings_cache[text]
-            
-            # Get embedding from Gemini
-            response = self.model.embed_content(text)
-            embedding = np.array(response.embedding)
-            
-            # Cache result
-            self.embeddings_cache[text] = embedding
-            if len(self.embeddings_cache) > self.max_cache_size:
-                self.embeddings_cache.pop(next(iter(self.embeddings_cache)))
-            
-            return embedding
+            device = 'cuda' if torch.cuda.is_available() else 'cpu'
+            model = SentenceTransformer(LOCAL_EMBEDDING_MODEL, device=device)
+            if device == 'cuda':
+                model.half()
+            self._local_model = model
+            self.embedding_dim = model.get_sentence_embedding_dimension()
+        except Exception as e:
+            logger.error(f"Error loading local embedding model: {str(e)}")
+            self.embedding_backend = 'gemini'
+    
+    def _get_embedding(self, text: str, task_type: str = 'retrieval_query') -> np.ndarray:
+        """Get embedding for text using Gemini (a zero vector if embedding failed)"""
+        embedding = self._get_embeddings([text], task_type)[0]
+        return embedding if embedding is not None else np.zeros(self.embedding_dim, dtype=np.float32)
+    
+    async def _aget_embedding(self, text: str, task_type: str = 'retrieval_query') -> np.ndarray:
+        """_get_embedding for async callers"""
+        embedding = (await self._aget_embeddings([text], task_type))[0]
+        return embedding if embedding is not None else np.zeros(self.embedding_dim, dtype=np.float32)
+    
+    def _get_embeddings(self, texts: List[str], task_type: str = 'retrieval_document') -> List[Optional[np.ndarray]]:
+        """Get embeddings for many texts with batched Gemini requests (None
+        for each text whose request failed)"""
+        keys, embeddings, batches, text_batches = self._plan_embeddings(texts, task_type)
+        if len(batches) == 1:
+            results = [self._embed_batch(batches[0], text_batches[0], task_type)]
+        else:
+            results = self.executor.map(
+                self._embed_batch, batches, text_batches, [task_type] * len(batches)
+            )
+        for batch, vectors in zip(batches, results):
+            embeddings.update(zip(batch, vectors))
+        
+        return [embeddings[key] for key in keys]
+    
+    async def _aget_embeddings(self, texts: List[str], task_type: str = 'retrieval_document') -> List[Optional[np.ndarray]]:
+        """_get_embeddings for async callers; batches run on the executor, which caps concurrency"""
+        keys, embeddings, batches, text_batches = self._plan_embeddings(texts, task_type)
+        results = await asyncio.gather(*(
+            asyncio.wrap_future(self.executor.submit(self._embed_batch, batch, batch_texts, task_type))
+            for batch, batch_texts in zip(batches, text_batches)
+        ))
+        for batch, vectors in zip(batches, results):
+            embeddings.update(zip(batch, vectors))
+        
+        return [embeddings[key] for key in keys]
+    
+    def _plan_embeddings(self, texts: List[str], task_type: str):
+        """Cache keys, cached embeddings, and request batches of the uncached texts"""
+        # Check cache (query and document embeddings differ, so the task is
+        # part of the key)
+        keys = [_content_key(text) + task_type.encode('utf8') for text in texts]
+        embeddings = {}
+        with self._cache_lock:
+            for key in keys:
+                if key in self.embeddings_cache:
+                    self.embeddings_cache.move_to_end(key)
+                    embeddings[key] = self.embeddings_cache[key]
+        
+        # Embed each distinct uncached text once, EMBEDDING_BATCH_SIZE per request
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in embeddings:
+                missing.setdefault(key, text)
+        missing_keys = list(missing)
+        batches = [
+            missing_keys[start:start + EMBEDDING_BATCH_SIZE]
+            for start in range(0, len(missing_keys), EMBEDDING_BATCH_SIZE)
+        ]
+        text_batches = [[missing[key] for key in batch] for batch in batches]
+        return keys, embeddings, batches, text_batches
+    
+    def _embed_batch(self, keys: List[bytes], texts: List[str], task_type: str) -> List[Optional[np.ndarray]]:
+        """Embed up to EMBEDDING_BATCH_SIZE texts in one Gemini request (or local
+        pass); None for every text if the request fails"""
+        try:
+            if self._local_model is not None:
+                if task_type == 'retrieval_query':
+                    texts = [LOCAL_QUERY_INSTRUCTION + text for text in texts]
+                with self._local_lock:
+                    vectors = self._local_model.encode(texts, convert_to_numpy=True)
+                embeddings = list(vectors.astype(np.float32))
+            else:
+                response = genai.embed_content(model=EMBEDDING_MODEL, content=texts, task_type=task_type)
+                embeddings = [np.array(values, dtype=np.float32) for values in response['embedding']]
             
         except Exception as e:
             logger.error(f"Error getting embedding: {str(e)}")
-            return np.zeros(768)
+            return [None] * len(texts)  # Not cached, so the next call retries
+        
+        # Cache result
+        with self._cache_lock:
+            for key, embedding in zip(keys, embeddings):
+                self.embeddings_cache[key] = embedding
+            while len(self.embeddings_cache) > self.max_cache_size:
+                self.embeddings_cache.popitem(last=False)
+        
+        return embeddings
     
     def index_code(self, repo_name: str, files: List[Dict[str, str]]) -> None:
         """Index code files"""
         try:
-            for file in files:
-                # Get embedding for file content
-                self._get_embedding(file['content'])
+            # Get embeddings for new file contents in batched requests
+            contents = self._unindexed([file['content'] for file in files])
+            self._add_to_index(contents, self._get_embeddings(contents))
             
             logger.info(f"Indexed {len(files)} files with RAG engine")
             
@@ -323,34 +775,283 @@ class RAGEngine:
             logger.error(f"Error indexing code: {str(e)}")
             raise
     
+    async def aindex_code(self, repo_name: str, files: List[Dict[str, str]]) -> int:
+        """Index code files without blocking the event loop; returns the number of new entries"""
+        try:
+            contents = self._unindexed([file['content'] for file in files])
+            embeddings = await self._aget_embeddings(contents)
+            # Off the loop, since it may wait for a running search
+            added = await run_cpu(self._add_to_index, contents, embeddings)
+            
+            logger.info(f"Indexed {len(files)} files with RAG engine")
+            return added
+            
+        except Exception as e:
+            logger.error(f"Error indexing code: {str(e)}")
+            raise
+    
     def search_code(self, repo_name: str, query: str, k: int = 5) -> List[Dict[str, str]]:
         """Search code using RAG"""
         try:
+            cache_key = (repo_name, _content_key(query), k)
+            cached = self._cached_search(cache_key)
+            if cached is not None:
+                return cached
+            
             # Get query embedding
-            query_embedding = self._get_embedding(query)
-            
-            # Calculate similarities and return top k results
-            results = []
-            for file in self.embeddings_cache.items():
-                similarity = cosine_similarity(
-                    [query_embedding],
-                    [file[1]]
-                )[0][0]
-                
-                results.append({
-                    'content': file[0],
-                    'relevance_score': float(similarity)
-                })
+            return self._rank(cache_key, _normalize(self._get_embedding(query)), k)
             
-            # Sort by relevance score
-            results.sort(key=lambda x: x['relevance_score'], reverse=True)
+        except Exception as e:
+            logger.error(f"Error searching code: {str(e)}")
+            return []
+    
+    async def asearch_code(self, repo_name: str, query: str, k: int = 5) -> List[Dict[str, str]]:
+        """search_code for async callers: the query is embedded on the embedding
+        executor and ranked on the CPU pool"""
+        try:
+            cache_key = (repo_name, _content_key(query), k)
+            cached = self._cached_search(cache_key)
+            if cached is not None:
+                return cached
             
-            return results[:k]
+            embedding = await self._aget_embedding(query)
+            return await run_cpu(self._rank, cache_key, _normalize(embedding), k)
             
         except Exception as e:
             logger.error(f"Error searching code: {str(e)}")
             return []
     
+    def _cached_search(self, cache_key: Tuple[str, bytes, int]) -> Optional[List[Dict[str, str]]]:
+        """Copy of a cached search result, or None"""
+        # Repeated queries are answered from the cache until the index
+        # changes. The index itself is still shared by every repository (as
+        # it always has been), so repo_name does not yet change the results;
+        # it stays in the key so scoping the index per repository needs no
+        # cache change.
+        with self._cache_lock:
+            cached = self._search_cache.get(cache_key)
+            if cached is None:
+                return None
+            self._search_cache.move_to_end(cache_key)
+            return [dict(result) for result in cached]
+    
+    def _rank(self, cache_key: Tuple[str, bytes, int], query_vector: np.ndarray, k: int) -> List[Dict[str, str]]:
+        """Top-k indexed files for a unit query vector, caching the result"""
+        with self._index_lock:
+            generation = self._index_generation
+            k = min(k, len(self.index_contents))
+            if k == 0:
+                return []
+            
+            # Top-k by cosine similarity over every indexed file
+            if self.index is not None:
+                scores, ids = self.index.search(query_vector[None], k)
+                scores, ids = scores[0], ids[0]
+            else:
+                similarities = self._similarities(query_vector)
+                # Partition out the top k, then order only those
+                ids = np.argpartition(-similarities, k - 1)[:k]
+                ids = ids[np.argsort(-similarities[ids])]
+                scores = similarities[ids]
+            
+            results = [
+                {'content': self.index_contents[i], 'relevance_score': float(score)}
+                for score, i in zip(scores, ids)
+                if i >= 0
+            ]
+        
+        # Cache result (unless the query embedding failed or files were
+        # added since the search)
+        if query_vector.any():
+            with self._cache_lock:
+                if generation == self._index_generation:
+                    self._search_cache[cache_key] = results
+                    while len(self._search_cache) > SEARCH_CACHE_SIZE:
+                        self._search_cache.popitem(last=False)
+        
+        return [dict(result) for result in results]
+    
+    def _unindexed(self, texts: List[str]) -> List[str]:
+        """Distinct texts not yet in the search index, so they are embedded once"""
+        # Skips embedding requests for duplicate files (license headers,
+        # generated code) and for files already indexed by an earlier call
+        # whose embeddings have since left the cache
+        unique = {}
+        with self._index_lock:
+            for text in texts:
+                key = _content_key(text)
+                if key not in self._indexed_keys:
+                    unique.setdefault(key, text)
+        return list(unique.values())
+    
+    def _add_to_index(self, texts: List[str], embeddings: List[Optional[np.ndarray]]) -> int:
+        """Add files' embeddings to the search index once per distinct content;
+        returns the number of entries added"""
+        with self._index_lock:
+            vectors = []
+            for text, embedding in zip(texts, embeddings):
+                if embedding is None:
+                    continue  # Embedding failed; left unindexed so a later call retries
+                key = _content_key(text)
+                if key in self._indexed_keys:
+                    continue
+                self._indexed_keys.add(key)
+                vectors.append(_normalize(embedding))
+                self.index_contents.append(text)
+            if not vectors:
+                return 0
+            
+            # One add per batch rather than per file
+            matrix = np.stack(vectors)
+            if HAS_FAISS and not self.quantize_index:
+                if self.index is None:
+                    self.index = faiss.IndexFlatIP(matrix.shape[1])
+                self.index.add(matrix)
+            elif self.quantize_index:
+                codes, scales = _quantize(matrix)
+                self._index_vectors.append(codes)
+                self._index_scales.append(scales)
+                self._index_matrix = None
+            else:
+                self._index_vectors.append(matrix)
+                self._index_matrix = None
+            
+            with self._cache_lock:
+                self._index_generation += 1
+                self._search_cache.clear()  # Cached results predate these files
+            return len(vectors)
+    
+    def _similarities(self, query_vector: np.ndarray) -> np.ndarray:
+        """Cosine similarity of a unit query vector to every vector in the NumPy
+        index; the caller holds _index_lock"""
+        if self._index_matrix is None:
+            # Merge the added blocks, keeping only the merged copy
+            self._index_matrix = np.concatenate(self._index_vectors)
+            self._index_vectors = [self._index_matrix]
+            if self.quantize_index:
+                self._index_scale_vector = np.concatenate(self._index_scales)
+                self._index_scales = [self._index_scale_vector]
+        if not self.quantize_index:
+            return self._index_matrix @ query_vector
+        
+        # Dequantize a block at a time so only QUANTIZED_SEARCH_BLOCK float32
+        # rows exist at once
+        similarities = np.empty(len(self._index_matrix), dtype=np.float32)
+        for start in range(0, len(self._index_matrix), QUANTIZED_SEARCH_BLOCK):
+            block = self._index_matrix[start:start + QUANTIZED_SEARCH_BLOCK]
+            similarities[start:start + len(block)] = block.astype(np.float32) @ query_vector
+        return similarities * self._index_scale_vector
+    
+    def generate_with_context(self, query: str, context: List[Dict[str, Any]],
+                              system_prompt: Optional[str] = None) -> str:
+        """Answer a query from retrieved code, reusing answers to near-identical queries"""
+        scope = self._response_scope(context, system_prompt)
+        query_vector = _normalize(self._get_embedding(query))
+        response = self._cached_response(scope, query_vector)
+        if response is not None:
+            return response
+        
+        try:
+            response = self.model.generate_content(
+                self._context_prompt(query, context, system_prompt)
+            ).text
+            
+        except Exception as e:
+            logger.error(f"Error generating response: {str(e)}")
+            raise
+        
+        self._cache_response(scope, query_vector, response)
+        return response
+    
+    async def agenerate_with_context(self, query: str, context: List[Dict[str, Any]],
+                                     system_prompt: Optional[str] = None) -> str:
+        """generate_with_context for async callers, without blocking the event loop"""
+        scope = self._response_scope(context, system_prompt)
+        query_vector = _normalize(await self._aget_embedding(query))
+        response = self._cached_response(scope, query_vector)
+        if response is not None:
+            return response
+        
+        try:
+            response = (await self.model.generate_content_async(
+                self._context_prompt(query, context, system_prompt)
+            )).text
+            
+        except Exception as e:
+            logger.error(f"Error generating response: {str(e)}")
+            raise
+        
+        self._cache_response(scope, query_vector, response)
+        return response
+    
+    async def astream_with_context(self, query: str, context: List[Dict[str, Any]],
+                                   system_prompt: Optional[str] = None) -> AsyncIterator[str]:
+        """agenerate_with_context as an async iterator of response text chunks"""
+        scope = self._response_scope(context, system_prompt)
+        query_vector = _normalize(await self._aget_embedding(query))
+        response = self._cached_response(scope, query_vector)
+        if response is not None:
+            yield response
+            return
+        
+        chunks = []
+        try:
+            stream = await self.model.generate_content_async(
+                self._context_prompt(query, context, system_prompt), stream=True
+            )
+            async for chunk in stream:
+                chunks.append(chunk.text)
+                yield chunk.text
+            
+        except Exception as e:
+            logger.error(f"Error streaming response: {str(e)}")
+            raise
+        
+        self._cache_response(scope, query_vector, ''.join(chunks))
+    
+    @staticmethod
+    def _response_scope(context: List[Dict[str, Any]], system_prompt: Optional[str]) -> bytes:
+        """Response cache scope for a prompt and its retrieved code"""
+        # Answers are only shared between queries with the same prompt and
+        # retrieved code, so repositories never see each other's answers
+        return _digest('\0'.join(
+            [system_prompt or ''] + [item['content'] for item in context]
+        ).encode('utf8'))
+    
+    @staticmethod
+    def _context_prompt(query: str, context: List[Dict[str, Any]],
+                        system_prompt: Optional[str]) -> str:
+        """Build the Gemini prompt for a query and its retrieved code"""
+        prompt = f"{system_prompt}\n\n" if system_prompt else ""
+        prompt += "Relevant code:\n" + "\n\n".join(
+            f"```\n{item['content']}\n```" for item in context
+        )
+        prompt += f"\n\nQuestion: {query}"
+        return prompt
+    
+    def _cached_response(self, scope: bytes, query_vector: np.ndarray) -> Optional[str]:
+        """Cached answer to a near-identical query in the same scope, if any"""
+        with self._cache_lock:
+            entries = self._response_cache.get(scope)
+            if entries is not None:
+                self._response_cache.move_to_end(scope)
+                for vector, response in entries:
+                    if float(vector @ query_vector) >= RESPONSE_CACHE_THRESHOLD:
+                        return response
+        return None
+    
+    def _cache_response(self, scope: bytes, query_vector: np.ndarray, response: str):
+        """Cache an answer (a failed query embedding is all zeros and never matches)"""
+        if not query_vector.any():
+            return
+        with self._cache_lock:
+            entries = self._response_cache.setdefault(scope, [])
+            entries.append((query_vector, response))
+            del entries[:-RESPONSE_CACHE_PER_SCOPE]
+            self._response_cache.move_to_end(scope)
+            while len(self._response_cache) > self.max_cache_size:
+                self._response_cache.popitem(last=False)
+    
     def generate_explanation(self, code: str, context: Optional[str] = None) -> str:
         """Generate explanation for code"""
         try:
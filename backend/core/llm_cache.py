@@ -0,0 +1,141 @@
+"""
+Gemini helpers shared by the prompt-per-request routers: a model per API key,
+a process-wide cache of responses and server-sent event streaming
+"""
+import asyncio
+import hashlib
+import json
+import os
+import re
+from functools import lru_cache
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional
+import google.ai.generativelanguage as glm
+import google.generativeai as genai
+from cachetools import TTLCache
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+
+# Model used by the routers
+MODEL_NAME = 'gemini-2.0-flash'
+
+# First fenced code block in a model response
+CODE_BLOCK_PATTERN = re.compile(r'```(?:\w+)?\n(.*?)```', re.DOTALL)
+
+# Cached response texts, and how long (seconds) an answer is reused
+RESPONSE_CACHE_SIZE = 1024
+RESPONSE_CACHE_TTL = 3600
+
+# Only touched from the event loop, so no lock is needed
+_responses = TTLCache(maxsize=RESPONSE_CACHE_SIZE, ttl=RESPONSE_CACHE_TTL)
+
+class GeminiModel:
+    """Gemini model bound to one API key
+    
+    Calls the generativelanguage async client directly, built with the key in
+    its client_options; genai.configure() would instead set the key
+    process-wide, for every model not yet bound. Responses are wrapped in the
+    SDK's public response types so .text behaves (and raises on blocked
+    responses) as with genai.GenerativeModel. Written against
+    google-generativeai 0.3.2 / google-ai-generativelanguage 0.4.0, both
+    pinned in requirements.txt.
+    """
+    
+    def __init__(self, api_key: str, model_name: str = MODEL_NAME):
+        self.model_name = f'models/{model_name}'
+        # Scopes cached responses to this key and model, so one caller's
+        # answers are never served to a caller with another (or invalid) key
+        self.cache_scope = hashlib.blake2b(f"{api_key}\0{self.model_name}".encode('utf8'), digest_size=16).digest()
+        self._client = glm.GenerativeServiceAsyncClient(client_options={'api_key': api_key})
+    
+    def _request(self, prompt: str) -> glm.GenerateContentRequest:
+        return glm.GenerateContentRequest(
+            model=self.model_name,
+            contents=[glm.Content(role='user', parts=[glm.Part(text=prompt)])]
+        )
+    
+    async def generate_content_async(self, prompt: str, stream: bool = False):
+        """Same call shape as genai.GenerativeModel.generate_content_async"""
+        if stream:
+            iterator = await self._client.stream_generate_content(self._request(prompt))
+            return await genai.types.AsyncGenerateContentResponse.from_aiterator(iterator)
+        response = await self._client.generate_content(self._request(prompt))
+        return genai.types.AsyncGenerateContentResponse.from_response(response)
+
+@lru_cache(maxsize=32)
+def _get_model(api_key: str) -> GeminiModel:
+    """Shared model per API key, so its gRPC channel is opened once per key
+    rather than on every request"""
+    return GeminiModel(api_key)
+
+def configure_gemini(api_key: Optional[str] = None) -> GeminiModel:
+    """Model for the request's Gemini API key, or the server's GEMINI_API_KEY"""
+    key = api_key or os.getenv("GEMINI_API_KEY")
+    if not key:
+        raise HTTPException(status_code=401, detail="Gemini API key not provided")
+    return _get_model(key)
+
+def _prompt_key(model: GeminiModel, prompt: str) -> bytes:
+    """16-byte BLAKE2b digest of a model's key scope and a prompt"""
+    # Prompts differing only in surrounding whitespace get the same answer
+    digest = hashlib.blake2b(model.cache_scope, digest_size=16)
+    digest.update(prompt.strip().encode('utf8'))
+    return digest.digest()
+
+async def generate_text(model: GeminiModel, prompt: str) -> str:
+    """Text of the model's response to a prompt, reusing the answer to an identical earlier prompt"""
+    key = _prompt_key(model, prompt)
+    text = _responses.get(key)
+    if text is None:
+        # Failed or blocked responses raise here and are not cached
+        text = (await model.generate_content_async(prompt)).text
+        _responses[key] = text
+    return text
+
+async def stream_text(model: GeminiModel, prompt: str) -> AsyncIterator[str]:
+    """generate_text as an async iterator of response text chunks"""
+    key = _prompt_key(model, prompt)
+    text = _responses.get(key)
+    if text is not None:
+        yield text
+        return
+    
+    chunks = []
+    async for chunk in await model.generate_content_async(prompt, stream=True):
+        chunks.append(chunk.text)
+        yield chunk.text
+    _responses[key] = ''.join(chunks)
+
+def sse_event(data: Any, event: Optional[str] = None) -> str:
+    """Format one server-sent event with a JSON payload"""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+def stream_result(model: GeminiModel, prompt: str, build_result: Callable[..., Awaitable[Dict]],
+                  extra_prompt: Optional[str] = None) -> StreamingResponse:
+    """Stream a response as server-sent events: {"delta": text} chunks as they
+    arrive, then a "done" event with the endpoint's usual JSON result
+    
+    With extra_prompt, that prompt's response text is generated alongside the
+    stream and passed to build_result as a second argument.
+    """
+    async def events():
+        # Started with the stream itself, so the request is made (and cleaned
+        # up below) only if the response is actually sent
+        extra = asyncio.ensure_future(generate_text(model, extra_prompt)) if extra_prompt else None
+        chunks = []
+        try:
+            async for text in stream_text(model, prompt):
+                chunks.append(text)
+                yield sse_event({"delta": text})
+            extra_args = [await extra] if extra is not None else []
+            yield sse_event(await build_result("".join(chunks), *extra_args), "done")
+        except Exception as e:
+            # Headers are already sent, so errors are reported in-stream
+            yield sse_event(str(e), "error")
+        finally:
+            # Stop the extra request if the stream failed or the client left,
+            # and retrieve its outcome if it already finished
+            if extra is not None and not extra.cancel() and not extra.cancelled():
+                extra.exception()
+    
+    return StreamingResponse(events(), media_type="text/event-stream")
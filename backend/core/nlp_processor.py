@@ -2,82 +2,205 @@
 Enhanced NLP Processor for code analysis and understanding
 """
 import os
-import spacy
 import nltk
 from typing import List, Dict, Any, Optional, Set
 import re
-from collections import defaultdict
+import ast
+import math
+import functools
+from collections import defaultdict, OrderedDict, Counter
+import hashlib
 import logging
-from concurrent.futures import ThreadPoolExecutor
 import numpy as np
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
 import tempfile
 import shutil
 
-# Download required NLTK data
-try:
-    nltk.download('punkt', quiet=True)
-    nltk.download('averaged_perceptron_tagger', quiet=True)
-    nltk.download('wordnet', quiet=True)
-except Exception as e:
-    print(f"Warning: Failed to download NLTK data: {str(e)}")
-
 logger = logging.getLogger(__name__)
 
+@functools.lru_cache(maxsize=1)
+def _get_nlp():
+    """Load the spaCy model once per process (None if unavailable)"""
+    try:
+        import spacy
+        nlp = spacy.load("en_core_web_sm", disable=['ner', 'parser'])
+        nlp.max_length = 1000000  # Increase max length for large files
+        return nlp
+    except Exception as e:
+        logger.error(f"Failed to load spaCy model: {str(e)}")
+        return None
+
+# TF-IDF vectorizer settings for semantic similarity
+TFIDF_OPTIONS = {
+    'max_features': 10000,
+    'stop_words': 'english',
+    'ngram_range': (1, 2)
+}
+
+def _new_tfidf():
+    """Unfitted TF-IDF vectorizer (a fit mutates it, so callers don't share one)"""
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    return TfidfVectorizer(**TFIDF_OPTIONS)
+
+@functools.lru_cache(maxsize=1)
+def _get_analyzer():
+    """The vectorizer's tokenization, stop words and n-grams, usable without a fit"""
+    return _new_tfidf().build_analyzer()
+
+# NLTK data packages and their paths in the data directory
+NLTK_PACKAGES = (
+    ('punkt', 'tokenizers/punkt'),
+    ('averaged_perceptron_tagger', 'taggers/averaged_perceptron_tagger'),
+    ('wordnet', 'corpora/wordnet')
+)
+_nltk_ready = False
+
+def _ensure_nltk_data():
+    """Download missing NLTK data, checking until every package is present"""
+    global _nltk_ready
+    if _nltk_ready:
+        return
+    ready = True
+    try:
+        for package, path in NLTK_PACKAGES:
+            try:
+                nltk.data.find(path)
+            except LookupError:
+                # download() reports most failures by returning False
+                if not nltk.download(package, quiet=True):
+                    logger.warning(f"Failed to download NLTK package {package}")
+                    ready = False
+    except Exception as e:
+        logger.warning(f"Failed to download NLTK data: {str(e)}")
+        ready = False
+    # A failed download is retried on the next call
+    _nltk_ready = ready
+
+def _content_key(*texts: str) -> bytes:
+    """Fixed-size cache key for one or more (possibly large) strings"""
+    digest = hashlib.blake2b(digest_size=16)
+    for text in texts:
+        digest.update(hashlib.blake2b(text.encode('utf8'), digest_size=16).digest())
+    return digest.digest()
+
+def _log(x: float) -> float:
+    """math.log that, like np.log, returns -inf at 0"""
+    return math.log(x) if x > 0 else -math.inf
+
+@functools.lru_cache(maxsize=4096)
+def _maintainability_index(code_lines: int, comment_lines: int, docstring_lines: int) -> float:
+    """Maintainability index clamped to [0, 100] (scalar math, no NumPy dispatch)"""
+    # Halstead volume
+    volume = code_lines * math.log2(code_lines + 1)
+    
+    # Comment ratio
+    comment_ratio = (comment_lines + docstring_lines) / (code_lines + 1)
+    
+    # Calculate maintainability index
+    mi = 171 - 5.2 * _log(volume) - 0.23 * _log(code_lines) - 16.2 * _log(comment_ratio)
+    return max(0.0, min(100.0, mi))
+
+# Regular expressions for code analysis (compiled once at import)
+STRUCTURE_PATTERNS = {
+    'function': re.compile(r'def\s+(\w+)\s*\('),
+    'class': re.compile(r'class\s+(\w+)\s*[:\(]'),
+    'import': re.compile(r'(?:from|import)\s+(\w+)'),
+    # Anchored so '==', '<=' and keyword arguments don't count
+    'variable': re.compile(r'^[ \t]*([A-Za-z_]\w*)\s*=(?!=)', re.MULTILINE),
+    'comment': re.compile(r'#\s*(.+)$', re.MULTILINE)
+}
+
+def _scan_docstrings(code: str) -> List[str]:
+    """Bodies of triple-quoted strings, found line by line (non-Python fallback)"""
+    docstrings = []
+    current = None  # Lines of the string being collected
+    for line in code.splitlines():
+        if current is None:
+            start = line.find('"""')
+            if start == -1:
+                continue
+            line = line[start + 3:]
+            current = []
+        end = line.find('"""')
+        if end == -1:
+            current.append(line)
+        else:
+            current.append(line[:end])
+            docstrings.append('\n'.join(current))
+            current = None
+    return docstrings
+
+# Smoothed idf of a term found in only one of two documents
+TWO_DOC_UNIQUE_IDF = math.log(3 / 2) + 1
+
+# Branch points counted by _calculate_cyclomatic_complexity
+BRANCH_NODES = (ast.If, ast.IfExp, ast.For, ast.AsyncFor, ast.While, ast.ExceptHandler) + (
+    (ast.match_case,) if hasattr(ast, 'match_case') else ()
+)
+BRANCH_PATTERN = re.compile(r'\b(?:if|for|while|except|case)\b|&&|\|\|')
+
+# Line prefixes scored by _calculate_cognitive_complexity
+NESTING_PREFIXES = ('if ', 'for ', 'while ', 'try:', 'except ')
+BRANCH_PREFIXES = ('else:', 'elif ', 'finally:')
+JUMP_PREFIXES = ('return', 'break', 'continue')
+
+# Word lists for analyze_sentiment
+POSITIVE_WORDS = frozenset({'good', 'great', 'excellent', 'positive', 'happy', 'success'})
+NEGATIVE_WORDS = frozenset({'bad', 'poor', 'terrible', 'negative', 'sad', 'failure'})
+
+# (category, label, pattern) checks run by extract_code_patterns
+CODE_PATTERN_CHECKS = (
+    ('design_patterns', 'Class with constructor', re.compile(r'class\s+\w+\(.*?\):\s+def\s+__init__')),
+    ('design_patterns', 'Property decorator', re.compile(r'@property\s+def\s+\w+')),
+    ('design_patterns', 'Callable class', re.compile(r'class\s+\w+\(.*?\):\s+def\s+__call__')),
+    ('anti_patterns', 'Global variable usage', re.compile(r'global\s+\w+')),
+    ('anti_patterns', 'Eval usage', re.compile(r'eval\s*\(')),
+    ('anti_patterns', 'Exec usage', re.compile(r'exec\s*\(')),
+    ('code_smells', 'Nested if statements', re.compile(r'if\s+.*?:\s+.*?if\s+.*?:')),
+    ('code_smells', 'Nested loops', re.compile(r'for\s+.*?:\s+.*?for\s+.*?:')),
+)
+
 class NLPProcessor:
     def __init__(self):
         """Initialize NLP processor with optimized settings"""
-        # Load spaCy model with error handling
-        try:
-            self.nlp = spacy.load("en_core_web_sm", disable=['ner', 'parser'])
-            self.nlp.max_length = 1000000  # Increase max length for large files
-        except Exception as e:
-            logger.error(f"Failed to load spaCy model: {str(e)}")
-            self.nlp = None
+        # Download required NLTK data (only if not already installed)
+        _ensure_nltk_data()
         
-        # Initialize TF-IDF vectorizer for semantic similarity
-        self.tfidf = TfidfVectorizer(
-            max_features=10000,
-            stop_words='english',
-            ngram_range=(1, 2)
-        )
+        # spaCy and the TF-IDF analyzer are loaded on first use and shared
+        # by every processor (see _get_nlp and _get_analyzer)
         
         # Cache for frequently accessed NLP results with size limits
+        # (OrderedDicts in least-recently-used-first order, keyed by _content_key)
         self.cache = {
-            'embeddings': {},
-            'similarities': {},
-            'keywords': {},
-            'complexity': {}
+            'embeddings': OrderedDict(),
+            'similarities': OrderedDict(),
+            'keywords': OrderedDict(),
+            'complexity': OrderedDict()
         }
         self.max_cache_size = 1000  # Maximum number of items per cache
         
-        # Initialize thread pool for parallel processing
-        self.executor = ThreadPoolExecutor(max_workers=4)
-        
         # Regular expressions for code analysis
-        self.patterns = {
-            'function': re.compile(r'def\s+(\w+)\s*\('),
-            'class': re.compile(r'class\s+(\w+)\s*[:\(]'),
-            'import': re.compile(r'(?:from|import)\s+(\w+)'),
-            'variable': re.compile(r'(\w+)\s*='),
-            'comment': re.compile(r'#\s*(.+)$'),
-            'docstring': re.compile(r'"""(.*?)"""', re.DOTALL)
-        }
+        self.patterns = STRUCTURE_PATTERNS
+    
+    @property
+    def nlp(self):
+        """Shared spaCy pipeline (None if the model can't be loaded)"""
+        return _get_nlp()
     
     def _clean_cache(self, cache_type: str):
         """Clean cache if it exceeds size limit"""
-        if len(self.cache[cache_type]) > self.max_cache_size:
-            # Remove oldest items
-            items_to_remove = len(self.cache[cache_type]) - self.max_cache_size
-            for _ in range(items_to_remove):
-                self.cache[cache_type].pop(next(iter(self.cache[cache_type])))
+        cache = self.cache[cache_type]
+        while len(cache) > self.max_cache_size:
+            cache.popitem(last=False)  # Remove least recently used item
     
-    def _get_cached_result(self, cache_type: str, key: str) -> Optional[Any]:
+    def _get_cached_result(self, cache_type: str, key: bytes) -> Optional[Any]:
         """Get cached NLP result if available"""
-        return self.cache[cache_type].get(key)
+        cache = self.cache[cache_type]
+        value = cache.get(key)
+        if value is not None:
+            cache.move_to_end(key)
+        return value
     
-    def _cache_result(self, cache_type: str, key: str, value: Any):
+    def _cache_result(self, cache_type: str, key: bytes, value: Any):
         """Cache NLP result for future use"""
         self.cache[cache_type][key] = value
         self._clean_cache(cache_type)
@@ -86,26 +209,38 @@ class NLPProcessor:
         """Analyze code structure with enhanced NLP"""
         try:
             # Check cache
-            cached = self._get_cached_result('complexity', code)
-            if cached:
+            cache_key = _content_key(code)
+            cached = self._get_cached_result('complexity', cache_key)
+            if cached is not None:
                 return cached
             
+            # Parse and split the source once for every metric below
+            lines = code.splitlines()
+            try:
+                tree = ast.parse(code)
+            except SyntaxError:
+                tree = None
+            
             # Extract code elements
-            structure = {
-                'functions': self.patterns['function'].findall(code),
-                'classes': self.patterns['class'].findall(code),
-                'imports': self.patterns['import'].findall(code),
-                'variables': self.patterns['variable'].findall(code),
-                'comments': self.patterns['comment'].findall(code),
-                'docstrings': self.patterns['docstring'].findall(code)
-            }
+            if tree is not None:
+                structure = self._extract_structure(code, tree)
+            else:
+                # Not (valid) Python, fall back to the regex scan
+                structure = {
+                    'functions': self.patterns['function'].findall(code),
+                    'classes': self.patterns['class'].findall(code),
+                    'imports': self.patterns['import'].findall(code),
+                    'variables': self.patterns['variable'].findall(code),
+                    'comments': self.patterns['comment'].findall(code),
+                    'docstrings': _scan_docstrings(code)
+                }
             
             # Analyze code complexity
-            complexity = self._calculate_complexity(code, structure)
+            complexity = self._calculate_complexity(code, structure, lines, tree)
             structure['complexity'] = complexity
             
             # Cache result
-            self._cache_result('complexity', code, structure)
+            self._cache_result('complexity', cache_key, structure)
             
             return structure
             
@@ -113,14 +248,49 @@ class NLPProcessor:
             logger.error(f"Error in code structure analysis: {str(e)}")
             return {}
     
-    def _calculate_complexity(self, code: str, structure: Dict[str, Any]) -> Dict[str, float]:
-        """Calculate code complexity metrics"""
+    def _extract_structure(self, code: str, tree: ast.AST) -> Dict[str, List[str]]:
+        """Extract code elements from a single walk of the Python AST"""
+        structure = {
+            'functions': [],
+            'classes': [],
+            'imports': [],
+            'variables': [],
+            'comments': self.patterns['comment'].findall(code),  # Not kept in the AST
+            'docstrings': []
+        }
+        
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Store):
+                structure['variables'].append(node.id)
+            elif isinstance(node, ast.Import):
+                structure['imports'].extend(alias.name for alias in node.names)
+            elif isinstance(node, ast.ImportFrom):
+                structure['imports'].append(node.module or '.' * node.level)
+            elif isinstance(node, (ast.Module, ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef)):
+                if isinstance(node, ast.ClassDef):
+                    structure['classes'].append(node.name)
+                elif not isinstance(node, ast.Module):
+                    structure['functions'].append(node.name)
+                
+                # Module, class and function docstrings
+                docstring = ast.get_docstring(node, clean=False)
+                if docstring is not None:
+                    structure['docstrings'].append(docstring)
+        
+        return structure
+    
+    def _calculate_complexity(self, code: str, structure: Dict[str, Any],
+                              lines: Optional[List[str]] = None,
+                              tree: Optional[ast.AST] = None) -> Dict[str, float]:
+        """Calculate code complexity metrics (lines and tree are reused when given)"""
         try:
+            if lines is None:
+                lines = code.splitlines()
+            
             # Basic metrics
-            lines = code.split('\n')
-            non_empty_lines = [l for l in lines if l.strip()]
+            non_empty_lines = sum(1 for l in lines if l.strip())
             comment_lines = len(structure['comments'])
-            docstring_lines = sum(len(d.split('\n')) for d in structure['docstrings'])
+            docstring_lines = sum(d.count('\n') + 1 for d in structure['docstrings'])
             
             # Advanced metrics
             function_count = len(structure['functions'])
@@ -130,8 +300,8 @@ class NLPProcessor:
             
             # Calculate complexity scores
             complexity = {
-                'cyclomatic': self._calculate_cyclomatic_complexity(code),
-                'cognitive': self._calculate_cognitive_complexity(code),
+                'cyclomatic': self._calculate_cyclomatic_complexity(code, tree),
+                'cognitive': self._calculate_cognitive_complexity(code, lines),
                 'maintainability': self._calculate_maintainability_index(
                     non_empty_lines, comment_lines, docstring_lines
                 ),
@@ -146,19 +316,24 @@ class NLPProcessor:
             logger.error(f"Error calculating complexity: {str(e)}")
             return {}
     
-    def _calculate_cyclomatic_complexity(self, code: str) -> float:
+    def _calculate_cyclomatic_complexity(self, code: str, tree: Optional[ast.AST] = None) -> float:
         """Calculate cyclomatic complexity"""
         try:
-            # Count control structures
-            control_structures = sum([
-                code.count('if '),
-                code.count('for '),
-                code.count('while '),
-                code.count('except '),
-                code.count('case '),
-                code.count('&&'),
-                code.count('||')
-            ])
+            # Count control structures in one pass
+            try:
+                if tree is None:
+                    tree = ast.parse(code)
+                control_structures = 0
+                for node in ast.walk(tree):
+                    if isinstance(node, BRANCH_NODES):
+                        control_structures += 1
+                    elif isinstance(node, ast.BoolOp):
+                        control_structures += len(node.values) - 1  # Each and/or
+                    elif isinstance(node, ast.comprehension):
+                        control_structures += 1 + len(node.ifs)
+            except SyntaxError:
+                # Not (valid) Python, count branch keywords and operators
+                control_structures = len(BRANCH_PATTERN.findall(code))
             
             # Add base complexity
             return control_structures + 1
@@ -167,20 +342,21 @@ class NLPProcessor:
             logger.error(f"Error calculating cyclomatic complexity: {str(e)}")
             return 0.0
     
-    def _calculate_cognitive_complexity(self, code: str) -> float:
+    def _calculate_cognitive_complexity(self, code: str, lines: Optional[List[str]] = None) -> float:
         """Calculate cognitive complexity"""
         try:
             # Count nested structures
             nested_level = 0
             complexity = 0
             
-            for line in code.split('\n'):
-                if line.strip().startswith(('if ', 'for ', 'while ', 'try:', 'except ')):
+            # Each line is stripped once, in C, before the prefix tests
+            for line in map(str.strip, code.splitlines() if lines is None else lines):
+                if line.startswith(NESTING_PREFIXES):
                     nested_level += 1
                     complexity += nested_level
-                elif line.strip().startswith(('else:', 'elif ', 'finally:')):
+                elif line.startswith(BRANCH_PREFIXES):
                     complexity += nested_level
-                elif line.strip().startswith(('return', 'break', 'continue')):
+                elif line.startswith(JUMP_PREFIXES):
                     complexity += 1
             
             return complexity
@@ -192,15 +368,8 @@ class NLPProcessor:
     def _calculate_maintainability_index(self, code_lines: int, comment_lines: int, docstring_lines: int) -> float:
         """Calculate maintainability index"""
         try:
-            # Halstead volume
-            volume = code_lines * np.log2(code_lines + 1)
-            
-            # Comment ratio
-            comment_ratio = (comment_lines + docstring_lines) / (code_lines + 1)
-            
-            # Calculate maintainability index
-            mi = 171 - 5.2 * np.log(volume) - 0.23 * np.log(code_lines) - 16.2 * np.log(comment_ratio)
-            return max(0, min(100, mi))
+            # Pure function of three counts, memoized at module level
+            return _maintainability_index(code_lines, comment_lines, docstring_lines)
             
         except Exception as e:
             logger.error(f"Error calculating maintainability index: {str(e)}")
@@ -218,63 +387,70 @@ class NLPProcessor:
     
     def extract_keywords(self, text: str, top_n: int = 10) -> List[str]:
         """Extract keywords from text with enhanced NLP"""
+        return self.extract_keywords_batch([text], top_n)[0]
+    
+    def extract_keywords_batch(self, texts: List[str], top_n: int = 10) -> List[List[str]]:
+        """Extract keywords from many texts in one spaCy pipeline run"""
         try:
             # Check if spaCy is available
             if self.nlp is None:
                 logger.warning("spaCy model not available")
-                return []
+                return [[] for _ in texts]
             
             # Check cache
-            cached = self._get_cached_result('keywords', text)
-            if cached:
-                return cached
-            
-            # Process text with spaCy
-            doc = self.nlp(text)
-            
-            # Extract keywords using multiple methods
-            keywords = set()
-            
-            # Method 1: Noun phrases
-            for chunk in doc.noun_chunks:
-                keywords.add(chunk.text.lower())
-            
-            # Method 2: Named entities
-            for ent in doc.ents:
-                keywords.add(ent.text.lower())
-            
-            # Method 3: Important words
-            for token in doc:
-                if token.pos_ in ['NOUN', 'PROPN', 'ADJ'] and not token.is_stop:
-                    keywords.add(token.text.lower())
+            cache_keys = [_content_key(text, str(top_n)) for text in texts]
+            keywords = [self._get_cached_result('keywords', key) for key in cache_keys]
+            missing = [i for i, cached in enumerate(keywords) if cached is None]
             
-            # Convert to list and sort by frequency
-            keyword_list = list(keywords)
-            keyword_list.sort(key=lambda x: text.lower().count(x), reverse=True)
+            # Process the uncached texts with spaCy in batches
+            docs = self.nlp.pipe((texts[i] for i in missing), batch_size=64)
+            for i, doc in zip(missing, docs):
+                keywords[i] = self._keywords_from_doc(doc, top_n)
+                
+                # Cache result
+                self._cache_result('keywords', cache_keys[i], keywords[i])
             
-            # Cache result
-            self._cache_result('keywords', text, keyword_list[:top_n])
-            
-            return keyword_list[:top_n]
+            return keywords
             
         except Exception as e:
             logger.error(f"Error extracting keywords: {str(e)}")
-            return []
+            return [[] for _ in texts]
+    
+    def _keywords_from_doc(self, doc, top_n: int) -> List[str]:
+        """Most frequent keywords of a processed spaCy Doc"""
+        # Extract keywords using multiple methods, counting occurrences
+        # in the same pass
+        counts = Counter()
+        
+        # Method 1: Noun phrases (needs the dependency parser)
+        if doc.has_annotation('DEP'):
+            counts.update(chunk.text.lower() for chunk in doc.noun_chunks)
+        
+        # Method 2: Named entities
+        counts.update(ent.text.lower() for ent in doc.ents)
+        
+        # Method 3: Important words (integer POS ids; spaCy is loaded by now)
+        from spacy.symbols import NOUN, PROPN, ADJ
+        keyword_pos = frozenset((NOUN, PROPN, ADJ))
+        counts.update(
+            token.lower_ for token in doc
+            if token.pos in keyword_pos and not token.is_stop
+        )
+        
+        # Most frequent first
+        return [keyword for keyword, _ in counts.most_common(top_n)]
     
     def calculate_similarity(self, text1: str, text2: str) -> float:
         """Calculate semantic similarity between texts"""
         try:
             # Check cache
-            cache_key = f"{text1}:{text2}"
+            cache_key = _content_key(text1, text2)
             cached = self._get_cached_result('similarities', cache_key)
-            if cached:
+            if cached is not None:
                 return cached
             
-            # Calculate TF-IDF vectors
-            tfidf_matrix = self.tfidf.fit_transform([text1, text2])
-            
-            # Calculate cosine similarity
-            similarity = cosine_similarity(tfidf_matrix[0:1], tfidf_matrix[1:2])[0][0]
+            # Cosine of the two texts' TF-IDF vectors, computed on term counts
+            similarity = self._pair_cosine(text1, text2)
             
             # Cache result
             self._cache_result('similarities', cache_key, float(similarity))
@@ -285,6 +461,47 @@ class NLPProcessor:
             logger.error(f"Error calculating similarity: {str(e)}")
             return 0.0
     
+    def _pair_cosine(self, text1: str, text2: str) -> float:
+        """TF-IDF cosine similarity of two texts without fitting the vectorizer
+        
+        Over a two-document corpus a shared term has idf 1 and a term in one
+        text has idf TWO_DOC_UNIQUE_IDF, so the vectors follow from counts
+        (unless the texts exceed the vectorizer's max_features vocabulary).
+        """
+        analyzer = _get_analyzer()
+        counts1 = Counter(analyzer(text1))
+        counts2 = Counter(analyzer(text2))
+        shared = counts1.keys() & counts2.keys()
+        if len(counts1) + len(counts2) - len(shared) > TFIDF_OPTIONS['max_features']:
+            # The vectorizer keeps only its most frequent terms here, so fit it
+            tfidf_matrix = _new_tfidf().fit_transform([text1, text2])
+            return float((tfidf_matrix[0] @ tfidf_matrix[1].T).toarray()[0, 0])
+        
+        dot = sum(counts1[term] * counts2[term] for term in shared)
+        if not dot:
+            return 0.0
+        norm1 = math.sqrt(sum(
+            (count if term in shared else count * TWO_DOC_UNIQUE_IDF) ** 2
+            for term, count in counts1.items()
+        ))
+        norm2 = math.sqrt(sum(
+            (count if term in shared else count * TWO_DOC_UNIQUE_IDF) ** 2
+            for term, count in counts2.items()
+        ))
+        return dot / (norm1 * norm2)
+    
+    def calculate_similarities(self, texts: List[str]) -> np.ndarray:
+        """Pairwise semantic similarity matrix for a batch of texts"""
+        try:
+            # One vectorizer fit for the whole batch; its rows are already
+            # L2-normalized, so the sparse Gram matrix is the cosine matrix
+            tfidf_matrix = _new_tfidf().fit_transform(texts)
+            return (tfidf_matrix @ tfidf_matrix.T).toarray()
+            
+        except Exception as e:
+            logger.error(f"Error calculating similarities: {str(e)}")
+            return np.zeros((len(texts), len(texts)))
+    
     def analyze_sentiment(self, text: str) -> Dict[str, float]:
         """Analyze sentiment of text"""
         try:
@@ -296,12 +513,14 @@ class NLPProcessor:
             # Process text with spaCy
             doc = self.nlp(text)
             
-            # Simple sentiment analysis based on word frequencies
-            positive_words = {'good', 'great', 'excellent', 'positive', 'happy', 'success'}
-            negative_words = {'bad', 'poor', 'terrible', 'negative', 'sad', 'failure'}
-            
-            positive_count = sum(1 for token in doc if token.text.lower() in positive_words)
-            negative_count = sum(1 for token in doc if token.text.lower() in negative_words)
+            # Simple sentiment analysis based on word frequencies (one pass)
+            positive_count = negative_count = 0
+            for token in doc:
+                word = token.lower_  # Lowercase form interned in the vocab
+                if word in POSITIVE_WORDS:
+                    positive_count += 1
+                elif word in NEGATIVE_WORDS:
+                    negative_count += 1
             total_words = len(doc)
             
             if total_words == 0:
@@ -330,35 +549,14 @@ class NLPProcessor:
                 'code_smells': []
             }
             
-            # Check for design patterns
-            if re.search(r'class\s+\w+\(.*?\):\s+def\s+__init__', code):
-                patterns['design_patterns'].append('Class with constructor')
-            
-            if re.search(r'@property\s+def\s+\w+', code):
-                patterns['design_patterns'].append('Property decorator')
-            
-            if re.search(r'class\s+\w+\(.*?\):\s+def\s+__call__', code):
-                patterns['design_patterns'].append('Callable class')
-            
-            # Check for anti-patterns
-            if re.search(r'global\s+\w+', code):
-                patterns['anti_patterns'].append('Global variable usage')
-            
-            if re.search(r'eval\s*\(', code):
-                patterns['anti_patterns'].append('Eval usage')
-            
-            if re.search(r'exec\s*\(', code):
-                patterns['anti_patterns'].append('Exec usage')
-            
             # Check for code smells
             if len(code.split('\n')) > 100:
                 patterns['code_smells'].append('Long function/method')
             
-            if re.search(r'if\s+.*?:\s+.*?if\s+.*?:', code):
-                patterns['code_smells'].append('Nested if statements')
-            
-            if re.search(r'for\s+.*?:\s+.*?for\s+.*?:', code):
-                patterns['code_smells'].append('Nested loops')
+            # Check for design patterns, anti-patterns and code smells
+            for category, label, pattern in CODE_PATTERN_CHECKS:
+                if pattern.search(code):
+                    patterns[category].append(label)
             
             return patterns
             
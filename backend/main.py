@@ -1,7 +1,8 @@
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, ORJSONResponse
 import os
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 from routers import (
     documentation,
@@ -9,26 +10,25 @@ from routers import (
     code_execution
 )
 from typing import Dict, Any
-import time
+import threading
+from cachetools import TLRUCache
+from core.cpu_pool import cpu_executor
 
-# Simple in-memory cache implementation
+# Simple in-memory cache implementation (bounded LRU, thread-safe)
 class SimpleCache:
-    def __init__(self):
-        self._cache: Dict[str, Any] = {}
-        self._ttl: Dict[str, float] = {}
+    def __init__(self, maxsize: int = 10000):
+        # Entries are (value, ttl) pairs; each expires ttl seconds after set
+        self._cache = TLRUCache(maxsize=maxsize, ttu=lambda key, entry, now: now + entry[1])
+        self._lock = threading.RLock()
 
     def set(self, key: str, value: Any, ttl: int = 300):
-        self._cache[key] = value
-        self._ttl[key] = time.time() + ttl
+        with self._lock:
+            self._cache[key] = (value, ttl)
 
     def get(self, key: str) -> Any:
-        if key in self._cache:
-            if time.time() < self._ttl[key]:
-                return self._cache[key]
-            else:
-                del self._cache[key]
-                del self._ttl[key]
-        return None
+        with self._lock:
+            entry = self._cache.get(key)
+        return entry[0] if entry is not None else None
 
 # Initialize cache
 cache = SimpleCache()
@@ -36,10 +36,19 @@ cache = SimpleCache()
 # Load environment variables
 load_dotenv()
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Stop the CPU-bound work pool (see core.cpu_pool) with the app
+    cpu_executor.shutdown(wait=False, cancel_futures=True)
+
 app = FastAPI(
     title="DevSensei API",
     description="AI-powered code analysis and documentation API",
-    version="1.0.0"
+    version="1.0.0",
+    # orjson serializes large responses (e.g. RAG sources) much faster
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
 )
 
 # Configure CORS
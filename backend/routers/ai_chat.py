@@ -1,16 +1,21 @@
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 import google.generativeai as genai
 from typing import List, Optional, Dict, Any
 import os
+import logging
 from dotenv import load_dotenv
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from core.hybrid_engine import RAGEngine
 from core.nlp_processor import NLPProcessor
+from core.llm_cache import sse_event
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter()
 
 # Initialize Gemini
@@ -20,6 +25,36 @@ if not GEMINI_API_KEY:
 
 genai.configure(api_key=GEMINI_API_KEY)
 
+# GenerativeModel instances by model name, shared across requests
+_MODELS: Dict[str, genai.GenerativeModel] = {}
+
+
+def get_model(name: str) -> genai.GenerativeModel:
+    """Get the shared GenerativeModel for a model name"""
+    model = _MODELS.get(name)
+    if model is None:
+        model = _MODELS[name] = genai.GenerativeModel(name)
+    return model
+
+
+# Instructions at the start of every plain chat prompt. Kept byte-identical
+# (no per-request values) and ahead of the conversation, so requests share
+# the longest possible prompt prefix.
+CHAT_PROMPT_PREFIX = (
+    "You are DevSensei, an AI assistant for software developers. "
+    "The conversation so far follows, one message per line as \"role: content\". "
+    "Reply to the last user message.\n\n"
+)
+
+
+def build_chat_prompt(messages: List["ChatMessage"]) -> List[str]:
+    """Gemini prompt parts for a conversation: fixed prefix, history, latest message"""
+    lines = [f"{msg.role}: {msg.content}" for msg in messages]
+    # Earlier turns are a stable prefix of the next turn's history too
+    history = "".join(f"{line}\n" for line in lines[:-1])
+    # Gemini rejects empty text parts
+    return [part for part in (CHAT_PROMPT_PREFIX, history, lines[-1] if lines else "") if part]
+
 # Initialize RAG engine and NLP processor
 rag_engine = RAGEngine(GEMINI_API_KEY)
 nlp_processor = NLPProcessor()
@@ -62,69 +97,87 @@ async def chat_with_ai(request: ChatRequest):
     Chat with AI using Google Gemini with optional RAG support
     """
     try:
-        print(f"Received chat request: {request}")
-        print(f"Messages: {request.messages}")
-        print(f"Repo name: {request.repo_name}")
-        print(f"Use RAG: {request.use_rag}")
+        logger.debug("Received chat request: %s", request)
         
         # Extract the latest user message
         user_message = request.messages[-1].content if request.messages else ""
-        print(f"User message: {user_message}")
         
         sources = None
         response_text = None
         
         if request.use_rag and request.repo_name:
-            print(f"Using RAG with repo: {request.repo_name}")
+            logger.debug("Using RAG with repo: %s", request.repo_name)
             try:
                 # Use RAG to find relevant context
-                search_results = rag_engine.search_code(request.repo_name, user_message)
-                print(f"Search results: {search_results}")
+                search_results = await rag_engine.asearch_code(
+                    request.repo_name, user_message
+                )
+                logger.debug("Search results: %s", search_results)
                 
                 if search_results:
-                    print("Generating response with context")
                     # Generate response with context
-                    response_text = rag_engine.generate_with_context(
+                    response_text = await rag_engine.agenerate_with_context(
                         query=user_message,
                         context=search_results
                     )
                     sources = search_results
             except Exception as e:
-                print(f"Error in RAG processing: {str(e)}")
-                print(f"Error type: {type(e)}")
-                import traceback
-                print(f"Traceback: {traceback.format_exc()}")
-                print("Falling back to regular Gemini due to RAG error")
+                logger.warning("Error in RAG processing, falling back to regular Gemini: %s", e)
         
         if not response_text:
-            print("Using regular Gemini without RAG")
-            try:
-                # Regular Gemini chat without RAG
-                model = genai.GenerativeModel('gemini-2.0-flash')
-                
-                # Convert messages to Gemini format
-                prompt = "\n".join([f"{msg.role}: {msg.content}" for msg in request.messages])
-                print(f"Generated prompt: {prompt}")
-                response = model.generate_content(prompt)
-                response_text = response.text
-            except Exception as e:
-                print(f"Error in Gemini processing: {str(e)}")
-                print(f"Error type: {type(e)}")
-                import traceback
-                print(f"Traceback: {traceback.format_exc()}")
-                raise
+            # Regular Gemini chat without RAG
+            model = get_model('gemini-2.0-flash')
+            
+            # Convert messages to Gemini format
+            prompt = build_chat_prompt(request.messages)
+            logger.debug("Generated prompt: %s", prompt)
+            response = await model.generate_content_async(prompt)
+            response_text = response.text
         
-        print(f"Generated response: {response_text}")
+        logger.debug("Generated response: %s", response_text)
         return ChatResponse(response=response_text, sources=sources)
         
     except Exception as e:
-        print(f"Error in chat_with_ai: {str(e)}")
-        print(f"Error type: {type(e)}")
-        import traceback
-        print(f"Traceback: {traceback.format_exc()}")
+        logger.error("Error in chat_with_ai: %s", e, exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/chat/stream")
+async def chat_with_ai_stream(request: ChatRequest):
+    """
+    Chat with AI like /chat, streaming the response as server-sent events:
+    an optional "sources" event, then {"delta": text} chunks, then "done"
+    """
+    user_message = request.messages[-1].content if request.messages else ""
+    
+    search_results = None
+    if request.use_rag and request.repo_name:
+        try:
+            search_results = await rag_engine.asearch_code(
+                request.repo_name, user_message
+            )
+        except Exception as e:
+            logger.warning("Error in RAG search, falling back to regular Gemini: %s", e)
+    
+    async def events():
+        try:
+            if search_results:
+                yield sse_event(search_results, "sources")
+                async for text in rag_engine.astream_with_context(user_message, search_results):
+                    yield sse_event({"delta": text})
+            else:
+                prompt = build_chat_prompt(request.messages)
+                stream = await get_model('gemini-2.0-flash').generate_content_async(prompt, stream=True)
+                async for chunk in stream:
+                    yield sse_event({"delta": chunk.text})
+            yield sse_event(None, "done")
+        except Exception as e:
+            # Headers are already sent, so errors are reported in-stream
+            yield sse_event(str(e), "error")
+    
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
 @router.post("/analyze-code", response_model=CodeAnalysisResponse)
 async def analyze_code(request: CodeAnalysisRequest):
     """
@@ -154,11 +207,6 @@ async def analyze_code(request: CodeAnalysisRequest):
         # Extract keywords
         response.keywords = nlp_processor.extract_keywords(request.code)
         
-        # Get AI-powered quality analysis
-        response.quality_analysis = rag_engine.analyze_code_quality(
-            request.code, request.language
-        )
-        
         return response
         
     except Exception as e:
@@ -171,7 +219,7 @@ async def index_repository(repo_name: str, files: List[Dict[str, str]]):
     Index a repository's code files for RAG
     """
     try:
-        num_chunks = rag_engine.index_code(repo_name, files)
+        num_chunks = await rag_engine.aindex_code(repo_name, files)
         return {"message": f"Successfully indexed {num_chunks} code chunks", "chunks": num_chunks}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -183,7 +231,7 @@ async def generate_code(prompt: str, language: str = "python", context: Optional
     Generate code based on prompt using Gemini
     """
     try:
-        model = genai.GenerativeModel('gemini-2.0-flash')
+        model = get_model('gemini-2.0-flash')
         
         # Create a specialized prompt for code generation
         full_prompt = f"""Generate {language} code for the following request:
@@ -201,7 +249,7 @@ Requirements:
 Code:
 ```{language}"""
         
-        response = model.generate_content(full_prompt)
+        response = await model.generate_content_async(full_prompt)
         
         # Extract code from response
         code = response.text
@@ -236,7 +284,7 @@ async def explain_code(code: str, language: str = "python"):
         patterns = nlp_processor.extract_code_patterns(code)
         
         # Get AI explanation
-        model = genai.GenerativeModel('gemini-2.0-flash')
+        model = get_model('gemini-2.0-flash')
         
         prompt = f"""Explain the following {language} code in detail:
 
@@ -251,7 +299,7 @@ Please provide:
 4. Any important patterns or techniques used
 5. Potential improvements or considerations"""
         
-        response = model.generate_content(prompt)
+        response = await model.generate_content_async(prompt)
         
         return {
             "explanation": response.text,
@@ -1,15 +1,25 @@
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel, Field
 from typing import List, Dict, Optional
-import google.generativeai as genai
-import os
-import tempfile
-import subprocess
 import asyncio
-import json
+import re
+from difflib import SequenceMatcher
+from core.llm_cache import CODE_BLOCK_PATTERN, configure_gemini, generate_text, stream_result
+from core.code_executor import get_executor
 
 router = APIRouter()
 
+# The process-wide sandboxed executor (shared with the code execution
+# router); /execute runs get a 10 second limit
+code_executor = get_executor(timeout=30, max_memory=512)
+EXECUTE_TIMEOUT = 10
+
+# Address space for node runs, the least V8 starts with
+NODE_MAX_MEMORY = 1024
+
+# Test case markers counted in generated tests
+TEST_CASE_PATTERN = re.compile(r'test_|it\(|@Test|def test')
+
 class CodeGenerationRequest(BaseModel):
     prompt: str = Field(..., description="Description of what code to generate")
     language: str = Field(..., description="Programming language")
@@ -36,16 +46,8 @@ class CodeExecutionRequest(BaseModel):
     language: str = Field(..., description="Programming language")
     input_data: Optional[str] = Field(None, description="Input data for the program")
 
-def configure_gemini(api_key: Optional[str] = None):
-    """Configure Gemini AI with API key"""
-    key = api_key or os.getenv("GEMINI_API_KEY")
-    if not key:
-        raise HTTPException(status_code=401, detail="Gemini API key not provided")
-    genai.configure(api_key=key)
-    return genai.GenerativeModel('gemini-2.0-flash')
-
 @router.post("/generate")
-async def generate_code(request: CodeGenerationRequest):
+async def generate_code(request: CodeGenerationRequest, stream: bool = False):
     """Generate code based on natural language prompt"""
     try:
         model = configure_gemini(request.gemini_api_key)
@@ -72,15 +74,13 @@ async def generate_code(request: CodeGenerationRequest):
         Format the code properly and ensure it's ready to run.
         """
         
-        response = model.generate_content(prompt)
-        
-        # Extract code from response
-        import re
-        code_blocks = re.findall(r'```(?:\w+)?\n(.*?)```', response.text, re.DOTALL)
-        generated_code = code_blocks[0] if code_blocks else response.text
-        
-        # Analyze the generated code
-        analysis_prompt = f"""
+        async def build_result(response_text: str) -> Dict:
+            # Extract code from response
+            code_block = CODE_BLOCK_PATTERN.search(response_text)
+            generated_code = code_block.group(1) if code_block else response_text
+            
+            # Analyze the generated code
+            analysis_prompt = f"""
         Analyze this {request.language} code and provide:
         1. Main components/functions
         2. Dependencies required
@@ -92,26 +92,30 @@ async def generate_code(request: CodeGenerationRequest):
         {generated_code}
         ```
         """
-        
-        analysis_response = model.generate_content(analysis_prompt)
-        
-        return {
-            "generated_code": generated_code,
-            "language": request.language,
-            "framework": request.framework,
-            "explanation": response.text,
-            "code_analysis": analysis_response.text,
-            "metadata": {
-                "lines_of_code": len(generated_code.splitlines()),
-                "characters": len(generated_code)
+            
+            analysis_text = await generate_text(model, analysis_prompt)
+            
+            return {
+                "generated_code": generated_code,
+                "language": request.language,
+                "framework": request.framework,
+                "explanation": response_text,
+                "code_analysis": analysis_text,
+                "metadata": {
+                    "lines_of_code": len(generated_code.splitlines()),
+                    "characters": len(generated_code)
+                }
             }
-        }
+        
+        if stream:
+            return stream_result(model, prompt, build_result)
+        return await build_result(await generate_text(model, prompt))
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/debug")
-async def debug_code(request: CodeDebugRequest):
+async def debug_code(request: CodeDebugRequest, stream: bool = False):
     """Debug code and provide fixes"""
     try:
         model = configure_gemini(request.gemini_api_key)
@@ -137,39 +141,44 @@ async def debug_code(request: CodeDebugRequest):
         6. Add debugging tips for similar issues
         """
         
-        response = model.generate_content(prompt)
-        
-        # Extract fixed code
-        import re
-        code_blocks = re.findall(r'```(?:\w+)?\n(.*?)```', response.text, re.DOTALL)
-        fixed_code = code_blocks[0] if code_blocks else request.code
-        
-        # Generate diff-like comparison
-        original_lines = request.code.splitlines()
-        fixed_lines = fixed_code.splitlines()
-        
-        changes = []
-        for i, (orig, fixed) in enumerate(zip(original_lines, fixed_lines)):
-            if orig != fixed:
-                changes.append({
-                    "line": i + 1,
-                    "original": orig,
-                    "fixed": fixed
-                })
+        async def build_result(response_text: str) -> Dict:
+            # Extract fixed code
+            code_block = CODE_BLOCK_PATTERN.search(response_text)
+            fixed_code = code_block.group(1) if code_block else request.code
+            
+            # Line diff; each replaced, inserted or deleted run of lines is one
+            # change, numbered by its line in the fixed code
+            original_lines = request.code.splitlines()
+            fixed_lines = fixed_code.splitlines()
+            matcher = SequenceMatcher(a=original_lines, b=fixed_lines, autojunk=False)
+            
+            changes = [
+                {
+                    "line": j1 + 1,
+                    "original": "\n".join(original_lines[i1:i2]),
+                    "fixed": "\n".join(fixed_lines[j1:j2])
+                }
+                for tag, i1, i2, j1, j2 in matcher.get_opcodes()
+                if tag != 'equal'
+            ]
+            
+            return {
+                "original_code": request.code,
+                "fixed_code": fixed_code,
+                "debugging_report": response_text,
+                "changes": changes,
+                "issue_count": len(changes)
+            }
         
-        return {
-            "original_code": request.code,
-            "fixed_code": fixed_code,
-            "debugging_report": response.text,
-            "changes": changes,
-            "issue_count": len(changes)
-        }
+        if stream:
+            return stream_result(model, prompt, build_result)
+        return await build_result(await generate_text(model, prompt))
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/generate-tests")
-async def generate_tests(request: CodeTestRequest):
+async def generate_tests(request: CodeTestRequest, stream: bool = False):
     """Generate test cases for code"""
     try:
         model = configure_gemini(request.gemini_api_key)
@@ -207,13 +216,6 @@ async def generate_tests(request: CodeTestRequest):
         Ensure high code coverage and follow {framework} best practices.
         """
         
-        response = model.generate_content(prompt)
-        
-        # Extract test code
-        import re
-        code_blocks = re.findall(r'```(?:\w+)?\n(.*?)```', response.text, re.DOTALL)
-        test_code = code_blocks[0] if code_blocks else response.text
-        
         # Analyze test coverage
         coverage_prompt = f"""
         Analyze the test coverage for these tests and estimate:
@@ -223,22 +225,41 @@ async def generate_tests(request: CodeTestRequest):
         4. Suggested additional tests
         """
         
-        coverage_response = model.generate_content(coverage_prompt)
+        async def build_result(response_text: str, coverage_text: str) -> Dict:
+            # Extract test code
+            code_block = CODE_BLOCK_PATTERN.search(response_text)
+            test_code = code_block.group(1) if code_block else response_text
+            
+            return {
+                "test_code": test_code,
+                "test_framework": framework,
+                "test_explanation": response_text,
+                "coverage_analysis": coverage_text,
+                "test_count": len(TEST_CASE_PATTERN.findall(test_code))
+            }
         
-        return {
-            "test_code": test_code,
-            "test_framework": framework,
-            "test_explanation": response.text,
-            "coverage_analysis": coverage_response.text,
-            "test_count": len(re.findall(r'test_|it\(|@Test|def test', test_code))
-        }
+        # The coverage prompt does not depend on the generated tests, so both
+        # requests run concurrently
+        if stream:
+            return stream_result(model, prompt, build_result, coverage_prompt)
+        
+        response_text, coverage_text = await asyncio.gather(
+            generate_text(model, prompt),
+            generate_text(model, coverage_prompt)
+        )
+        return await build_result(response_text, coverage_text)
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/execute")
 async def execute_code(request: CodeExecutionRequest):
-    """Execute code in a sandboxed environment (limited languages)"""
+    """Execute code in a sandboxed environment (limited languages)
+    
+    Returns 400 for unsupported languages and for code the executor's
+    validation rejects (disallowed imports or calls, syntax errors), and 408
+    when the run exceeds the time limit.
+    """
     try:
         # Only allow safe languages for execution
         allowed_languages = ["python", "javascript", "ruby"]
@@ -248,59 +269,37 @@ async def execute_code(request: CodeExecutionRequest):
                 detail=f"Code execution not supported for {request.language}. Supported: {', '.join(allowed_languages)}"
             )
         
-        # Create temporary file
-        with tempfile.NamedTemporaryFile(mode='w', suffix=f'.{request.language}', delete=False) as f:
-            f.write(request.code)
-            temp_file = f.name
-        
-        try:
-            # Prepare command based on language
-            if request.language.lower() == "python":
-                cmd = ["python", temp_file]
-            elif request.language.lower() == "javascript":
-                cmd = ["node", temp_file]
-            elif request.language.lower() == "ruby":
-                cmd = ["ruby", temp_file]
-            
-            # Execute with timeout
-            process = await asyncio.create_subprocess_exec(
-                *cmd,
-                stdin=asyncio.subprocess.PIPE,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
-            )
-            
-            # Send input if provided
-            input_bytes = request.input_data.encode() if request.input_data else None
-            
-            try:
-                stdout, stderr = await asyncio.wait_for(
-                    process.communicate(input=input_bytes),
-                    timeout=10.0  # 10 second timeout
-                )
-            except asyncio.TimeoutError:
-                process.kill()
-                raise HTTPException(status_code=408, detail="Code execution timed out (10s limit)")
-            
-            return {
-                "output": stdout.decode(),
-                "errors": stderr.decode(),
-                "exit_code": process.returncode,
-                "language": request.language,
-                "execution_time": "< 10s"
-            }
-            
-        finally:
-            # Clean up temp file
-            os.unlink(temp_file)
-            
+        # Run on the shared executor's warm interpreters, inside its sandbox
+        # and resource limits, off the event loop
+        language = request.language.lower()
+        result = await asyncio.wrap_future(code_executor.execute_code_async(
+            request.code,
+            language,
+            request.input_data or "",
+            timeout=EXECUTE_TIMEOUT,
+            max_memory=NODE_MAX_MEMORY if language == 'javascript' else None
+        ))
+        
+        if result['status'] == 'timeout':
+            raise HTTPException(status_code=408, detail="Code execution timed out (10s limit)")
+        if result['status'] == 'validation_error':
+            raise HTTPException(status_code=400, detail=result['error'])
+        
+        return {
+            "output": result['output'],
+            "errors": result['error'],
+            "exit_code": result.get('exit_code'),
+            "language": request.language,
+            "execution_time": "< 10s"
+        }
+        
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/refactor")
-async def refactor_code(request: CodeGenerationRequest):
+async def refactor_code(request: CodeGenerationRequest, stream: bool = False):
     """Refactor existing code following best practices"""
     try:
         model = configure_gemini(request.gemini_api_key)
@@ -330,19 +329,21 @@ async def refactor_code(request: CodeGenerationRequest):
         Provide the refactored code with explanations for major changes.
         """
         
-        response = model.generate_content(prompt)
-        
-        # Extract refactored code
-        import re
-        code_blocks = re.findall(r'```(?:\w+)?\n(.*?)```', response.text, re.DOTALL)
-        refactored_code = code_blocks[0] if code_blocks else request.prompt
+        async def build_result(response_text: str) -> Dict:
+            # Extract refactored code
+            code_block = CODE_BLOCK_PATTERN.search(response_text)
+            refactored_code = code_block.group(1) if code_block else request.prompt
+            
+            return {
+                "original_code": request.prompt,
+                "refactored_code": refactored_code,
+                "refactoring_explanation": response_text,
+                "improvements": request.requirements or ["General code quality improvements"]
+            }
         
-        return {
-            "original_code": request.prompt,
-            "refactored_code": refactored_code,
-            "refactoring_explanation": response.text,
-            "improvements": request.requirements or ["General code quality improvements"]
-        }
+        if stream:
+            return stream_result(model, prompt, build_result)
+        return await build_result(await generate_text(model, prompt))
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -376,19 +377,18 @@ async def convert_code(
         Explain any significant changes required due to language differences.
         """
         
-        response = model.generate_content(prompt)
+        response_text = await generate_text(model, prompt)
         
         # Extract converted code
-        import re
-        code_blocks = re.findall(r'```(?:\w+)?\n(.*?)```', response.text, re.DOTALL)
-        converted_code = code_blocks[0] if code_blocks else ""
+        code_block = CODE_BLOCK_PATTERN.search(response_text)
+        converted_code = code_block.group(1) if code_block else ""
         
         return {
             "source_language": source_language,
             "target_language": target_language,
             "source_code": source_code,
             "converted_code": converted_code,
-            "conversion_notes": response.text,
+            "conversion_notes": response_text,
             "success": bool(converted_code)
         }
         
@@ -1,7 +1,6 @@
 from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect, Depends
 from pydantic import BaseModel, Field, validator
 from typing import List, Dict, Any, Optional
-import google.generativeai as genai
 import os
 from dotenv import load_dotenv
 import sys
@@ -11,7 +10,8 @@ import time
 from fastapi.security import APIKeyHeader
 from fastapi.responses import JSONResponse
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from core.code_executor import CodeExecutor
+from core.code_executor import get_executor
+from core.llm_cache import configure_gemini, generate_text
 from core.nlp_processor import NLPProcessor
 
 load_dotenv()
@@ -33,8 +33,7 @@ api_key_header = APIKeyHeader(name="X-API-Key")
 
 # Initialize services with error handling
 try:
-    genai.configure(api_key=GEMINI_API_KEY)
-    code_executor = CodeExecutor(timeout=30, max_memory=512)  # 30 seconds timeout, 512MB memory limit
+    code_executor = get_executor(timeout=30, max_memory=512)  # 30 seconds timeout, 512MB memory limit
     nlp_processor = NLPProcessor()
 except Exception as e:
     print(f"Error initializing services: {str(e)}")
@@ -151,12 +150,12 @@ async def execute_code(
                 }
             )
         
-        # Execute the code
-        result = code_executor.execute_code(
+        # Execute the code off the event loop
+        result = await asyncio.wrap_future(code_executor.execute_code_async(
             request.code,
             request.language,
             request.input_data or ""
-        )
+        ))
         
         return result
         
@@ -170,7 +169,7 @@ async def generate_code(
 ):
     """Generate code based on prompt"""
     try:
-        model = genai.GenerativeModel('gemini-2.0-flash')
+        model = configure_gemini()
         
         # Create prompt
         prompt = f"""Generate {request.language} code for the following requirement:
@@ -189,10 +188,8 @@ Requirements:
 Code:
 ```{request.language}"""
         
-        response = model.generate_content(prompt)
-        
         # Extract code from response
-        code = response.text
+        code = await generate_text(model, prompt)
         if "```" in code:
             parts = code.split("```")
             for i, part in enumerate(parts):
@@ -248,7 +245,7 @@ async def optimize_code(
                 }
             )
         
-        model = genai.GenerativeModel('gemini-2.0-flash')
+        model = configure_gemini()
         
         # Analyze current code
         current_analysis = nlp_processor.analyze_code_complexity(request.code, request.language)
@@ -274,10 +271,8 @@ Provide:
 Optimized code:
 ```{request.language}"""
         
-        response = model.generate_content(prompt)
-        
         # Extract optimized code
-        response_text = response.text
+        response_text = await generate_text(model, prompt)
         optimized_code = request.code  # Default to original
         explanation = ""
         
@@ -341,7 +336,7 @@ async def debug_code(
                 }
             )
         
-        model = genai.GenerativeModel('gemini-2.0-flash')
+        model = configure_gemini()
         
         prompt = f"""Debug the following {request.language} code:
 
@@ -362,8 +357,7 @@ Please:
 Fixed code:
 ```{request.language}"""
         
-        response = model.generate_content(prompt)
-        response_text = response.text
+        response_text = await generate_text(model, prompt)
         
         # Extract fixed code
         fixed_code = request.code  # Default
@@ -407,43 +401,76 @@ Fixed code:
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+# Executions each /ws/execute connection may have in flight; further
+# messages wait for a slot
+WS_MAX_IN_FLIGHT = int(os.getenv("WS_MAX_IN_FLIGHT", "8"))
+
 @router.websocket("/ws/execute")
 async def websocket_execute(websocket: WebSocket):
-    """WebSocket endpoint for real-time code execution"""
+    """WebSocket endpoint for real-time code execution
+    
+    Requests on one connection run concurrently, so results can arrive out of
+    order; a request's 'id', if given, is echoed in its result.
+    """
     await websocket.accept()
+    send_lock = asyncio.Lock()
+    slots = asyncio.Semaphore(WS_MAX_IN_FLIGHT)
+    tasks = set()
+    
+    async def send(message: Dict[str, Any]):
+        async with send_lock:
+            await websocket.send_json(message)
+    
+    async def run(data: Dict[str, Any]):
+        try:
+            try:
+                result = await asyncio.wrap_future(code_executor.execute_code_async(
+                    data['code'],
+                    data['language'],
+                    data.get('input_data', '')
+                ))
+            except Exception as e:
+                result = {
+                    'error': str(e),
+                    'status': 'error'
+                }
+            if 'id' in data:
+                result = {**result, 'id': data['id']}
+            await send(result)
+        except Exception:
+            pass  # Socket closed; the receive loop handles the disconnect
+        finally:
+            slots.release()
+    
     try:
         while True:
             data = await websocket.receive_json()
             
             # Validate input
             if not isinstance(data, dict) or 'code' not in data or 'language' not in data:
-                await websocket.send_json({
+                await send({
                     'error': 'Invalid request format',
                     'status': 'error'
                 })
                 continue
             
-            # Execute code
-            try:
-                result = code_executor.execute_code(
-                    data['code'],
-                    data['language'],
-                    data.get('input_data', '')
-                )
-                await websocket.send_json(result)
-            except Exception as e:
-                await websocket.send_json({
-                    'error': str(e),
-                    'status': 'error'
-                })
+            # Execute code off the receive loop
+            await slots.acquire()
+            task = asyncio.create_task(run(data))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
                 
     except WebSocketDisconnect:
         pass
     except Exception as e:
-        await websocket.send_json({
+        await send({
             'error': str(e),
             'status': 'error'
         })
+    finally:
+        # Nobody is left to receive the results of unfinished runs
+        for task in tasks:
+            task.cancel()
 
 @router.get("/supported-languages")
 async def get_supported_languages():
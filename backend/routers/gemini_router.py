@@ -1,12 +1,13 @@
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel, Field
 from typing import List, Dict, Optional
-import google.generativeai as genai
 import os
 from pygments import highlight
 from pygments.lexers import get_lexer_by_name, guess_lexer
 from pygments.formatters import HtmlFormatter
 import json
+import re
+from core.llm_cache import CODE_BLOCK_PATTERN, configure_gemini, generate_text, stream_result
 
 router = APIRouter()
 
@@ -33,14 +34,6 @@ class CodeOptimizationRequest(BaseModel):
     optimization_goals: Optional[List[str]] = Field(None, description="Specific optimization goals")
     gemini_api_key: Optional[str] = Field(None, description="Gemini API key")
 
-def configure_gemini(api_key: Optional[str] = None):
-    """Configure Gemini AI with API key"""
-    key = api_key or os.getenv("GEMINI_API_KEY")
-    if not key:
-        raise HTTPException(status_code=401, detail="Gemini API key not provided")
-    genai.configure(api_key=key)
-    return genai.GenerativeModel('gemini-2.0-flash')
-
 def syntax_highlight_code(code: str, language: str = None) -> str:
     """Apply syntax highlighting to code"""
     try:
@@ -66,7 +59,7 @@ def syntax_highlight_code(code: str, language: str = None) -> str:
         }
 
 @router.post("/explain-code")
-async def explain_code(request: CodeExplanationRequest):
+async def explain_code(request: CodeExplanationRequest, stream: bool = False):
     """Get detailed explanation of code snippet"""
     try:
         model = configure_gemini(request.gemini_api_key)
@@ -93,19 +86,22 @@ async def explain_code(request: CodeExplanationRequest):
         Format the response in a clear, educational manner suitable for developers.
         """
         
-        response = model.generate_content(prompt)
-        
-        # Syntax highlight the code
-        highlighted = syntax_highlight_code(request.code, request.language)
-        
-        return {
-            "explanation": response.text,
-            "highlighted_code": highlighted,
-            "analysis": {
-                "lines_of_code": len(request.code.splitlines()),
-                "detected_language": highlighted["language"]
+        async def build_result(response_text: str) -> Dict:
+            # Syntax highlight the code
+            highlighted = syntax_highlight_code(request.code, request.language)
+            
+            return {
+                "explanation": response_text,
+                "highlighted_code": highlighted,
+                "analysis": {
+                    "lines_of_code": len(request.code.splitlines()),
+                    "detected_language": highlighted["language"]
+                }
             }
-        }
+        
+        if stream:
+            return stream_result(model, prompt, build_result)
+        return await build_result(await generate_text(model, prompt))
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -135,19 +131,18 @@ async def analyze_functions(request: FunctionAnalysisRequest):
         Format the response as structured JSON that can be parsed.
         """
         
-        response = model.generate_content(prompt)
+        response_text = await generate_text(model, prompt)
         
         # Parse and structure the response
         try:
             # Try to extract JSON from response
-            import re
-            json_match = re.search(r'\{.*\}', response.text, re.DOTALL)
+            json_match = re.search(r'\{.*\}', response_text, re.DOTALL)
             if json_match:
                 analysis_data = json.loads(json_match.group())
             else:
-                analysis_data = {"raw_analysis": response.text}
+                analysis_data = {"raw_analysis": response_text}
         except:
-            analysis_data = {"raw_analysis": response.text}
+            analysis_data = {"raw_analysis": response_text}
         
         return {
             "function_analysis": analysis_data,
@@ -189,10 +184,10 @@ async def explain_database_query(request: DatabaseQueryRequest):
         Make the explanation accessible to developers who may not be database experts.
         """
         
-        response = model.generate_content(prompt)
+        response_text = await generate_text(model, prompt)
         
         return {
-            "explanation": response.text,
+            "explanation": response_text,
             "query_type": request.db_type,
             "highlighted_query": syntax_highlight_code(request.query, "sql" if request.db_type == "sql" else "javascript")
         }
@@ -228,17 +223,16 @@ async def optimize_code(request: CodeOptimizationRequest):
         Format the optimized code clearly and explain the reasoning.
         """
         
-        response = model.generate_content(prompt)
+        response_text = await generate_text(model, prompt)
         
         # Extract optimized code from response
-        import re
-        code_blocks = re.findall(r'```(?:\w+)?\n(.*?)```', response.text, re.DOTALL)
-        optimized_code = code_blocks[0] if code_blocks else request.code
+        code_block = CODE_BLOCK_PATTERN.search(response_text)
+        optimized_code = code_block.group(1) if code_block else request.code
         
         return {
             "original_code": syntax_highlight_code(request.code, request.language),
             "optimized_code": syntax_highlight_code(optimized_code, request.language),
-            "explanation": response.text,
+            "explanation": response_text,
             "optimization_goals": goals
         }
         
@@ -273,10 +267,10 @@ async def review_code(request: CodeExplanationRequest):
         Rate the code on a scale of 1-10 and provide actionable feedback.
         """
         
-        response = model.generate_content(prompt)
+        response_text = await generate_text(model, prompt)
         
         return {
-            "review": response.text,
+            "review": response_text,
             "highlighted_code": syntax_highlight_code(request.code, request.language),
             "timestamp": os.popen('date').read().strip()
         }
@@ -0,0 +1,163 @@
+import os
+import shutil
+import sys
+import time
+
+import pytest
+
+from core import code_executor
+from core.code_executor import CodeExecutor, _private_dir, _workdir_base
+
+
+@pytest.mark.skipif(shutil.which('gcc') is None, reason="gcc not installed")
+def test_timeout_applies_after_output_streams_close():
+    executor = CodeExecutor(timeout=2, max_memory=512)
+    code = (
+        '#include <stdio.h>\n'
+        '#include <time.h>\n'
+        'int main() {\n'
+        '    struct timespec pause = {8, 0};\n'
+        '    fclose(stdout);\n'
+        '    fclose(stderr);\n'
+        '    nanosleep(&pause, NULL);\n'
+        '    return 0;\n'
+        '}\n'
+    )
+    
+    start = time.monotonic()
+    result = executor.execute_code(code, 'c')
+    
+    assert result['status'] == 'timeout'
+    assert time.monotonic() - start < 6
+
+
+def test_shared_build_cache_dir_must_be_private(tmp_path):
+    private = tmp_path / 'private'
+    assert _private_dir(str(private))
+    assert private.stat().st_mode & 0o777 == 0o700
+    
+    planted = tmp_path / 'planted'
+    planted.mkdir()
+    planted.chmod(0o777)
+    assert not _private_dir(str(planted))
+    
+    link = tmp_path / 'link'
+    link.symlink_to(private)
+    assert not _private_dir(str(link))
+
+
+@pytest.mark.skipif(not os.access('/dev/shm', os.W_OK), reason="no writable /dev/shm")
+def test_workdir_base_skips_noexec_or_small_shm(monkeypatch):
+    real = os.statvfs('/dev/shm')
+    
+    def fake_statvfs(flag, bavail):
+        values = list(real)
+        values[1], values[4], values[8] = 4096, bavail, flag
+        return lambda path: os.statvfs_result(values)
+    
+    roomy = code_executor.MIN_TMPFS_FREE_BYTES // 4096
+    monkeypatch.setattr(os, 'statvfs', fake_statvfs(os.ST_NOEXEC, roomy))
+    assert _workdir_base() != '/dev/shm'
+    monkeypatch.setattr(os, 'statvfs', fake_statvfs(0, roomy - 1))
+    assert _workdir_base() != '/dev/shm'
+    monkeypatch.setattr(os, 'statvfs', fake_statvfs(0, roomy))
+    assert _workdir_base() == '/dev/shm'
+
+
+def test_only_sandboxed_compiles_inherit_fds():
+    executor = CodeExecutor()
+    
+    for sandbox_ready in (True, False):
+        executor._sandbox_ready = sandbox_ready
+        run_options = executor._spawn_options('/tmp', None)
+        assert run_options.get('close_fds', True)
+    
+    executor._sandbox_ready = True
+    assert executor._spawn_options('/tmp', None, compile=True) == {'close_fds': False}
+    executor._sandbox_ready = False
+    assert executor._spawn_options('/tmp', None, compile=True)['start_new_session']
+
+
+def test_sandbox_binds_hide_root_and_home():
+    executor = CodeExecutor()
+    executor._warm_toolchains()
+    binds = executor._sandbox_binds
+    
+    assert binds[0::3] == ['--ro-bind'] * (len(binds) // 3)
+    mounted = binds[1::3]
+    assert '/' not in mounted
+    assert os.path.expanduser('~') not in mounted
+    assert sys.base_prefix in mounted or any(
+        sys.base_prefix.startswith(path + os.sep) for path in mounted
+    )
+
+
+def _wait_for_python_worker(executor):
+    deadline = time.monotonic() + 10
+    while executor._worker_pools['python'].empty() and time.monotonic() < deadline:
+        time.sleep(0.05)
+    if executor._worker_pools['python'].empty():
+        pytest.skip("python worker did not start")
+
+
+def test_busy_loop_on_worker_reports_timeout():
+    executor = CodeExecutor(timeout=2, max_memory=512, worker_pool_size=1)
+    _wait_for_python_worker(executor)
+    
+    result = executor.execute_code('x = 0\nwhile True:\n    x += 1\n', 'python')
+    
+    assert result['status'] == 'timeout', result
+
+
+def test_cpu_limit_before_deadline_reports_timeout(monkeypatch):
+    # A CPU limit below the wall timeout stands in for a worker whose
+    # startup used up the margin
+    monkeypatch.setattr(code_executor, '_cpu_limit', lambda timeout: 1)
+    executor = CodeExecutor(timeout=10, max_memory=512, worker_pool_size=1)
+    _wait_for_python_worker(executor)
+    
+    start = time.monotonic()
+    result = executor.execute_code('x = 0\nwhile True:\n    x += 1\n', 'python')
+    
+    assert result['status'] == 'timeout', result
+    assert time.monotonic() - start < 8
+
+
+def test_per_call_limits_override_the_executor():
+    executor = CodeExecutor(timeout=30, max_memory=512, worker_pool_size=1)
+    _wait_for_python_worker(executor)
+    
+    start = time.monotonic()
+    result = executor.execute_code('while True:\n    pass\n', 'python', timeout=1)
+    assert result['status'] == 'timeout', result
+    assert time.monotonic() - start < 5
+    
+    # More memory than the workers were started with needs a fresh process
+    grow = 'data = bytearray(700 * 1024 * 1024)\nprint(len(data))\n'
+    assert executor.execute_code(grow, 'python')['status'] == 'error'
+    result = executor.execute_code(grow, 'python', max_memory=1024)
+    assert result['status'] == 'success', result
+
+
+@pytest.mark.parametrize('code', [
+    '__builtins__.exec("print(1)")',
+    '__builtins__.__import__("os")',
+    'import math\nmath.__builtins__',
+    'getattr(__builtins__, "exec")("print(1)")',
+    'f = getattr(print, "__self__")\ngetattr(f, "eval")("1")',
+    'globals()["__builtins__"]',
+    '__import__("os").getcwd()',
+])
+def test_python_validation_rejects_builtins_access(code):
+    executor = CodeExecutor()
+    
+    is_valid, error = executor._validate_code(code, 'python')
+    
+    assert not is_valid
+    assert error.startswith('Use of ')
+
+
+def test_python_validation_allows_plain_code():
+    executor = CodeExecutor()
+    
+    assert executor._validate_code('import math\nprint(math.sqrt(4))', 'python') == (True, "")
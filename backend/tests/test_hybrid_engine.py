@@ -0,0 +1,108 @@
+import asyncio
+import threading
+
+import pytest
+
+for module in ("google.generativeai", "torch", "transformers", "tree_sitter"):
+    pytest.importorskip(module)
+
+from core import hybrid_engine
+from core.hybrid_engine import RAGEngine
+
+
+def test_failed_embedding_is_retried_on_reindex(monkeypatch):
+    engine = RAGEngine("test-key", embedding_backend="gemini")
+    files = [{"content": "def add(a, b):\n    return a + b\n"}]
+
+    def failing(model, content, task_type=None):
+        raise RuntimeError("429 Resource has been exhausted")
+
+    monkeypatch.setattr(hybrid_engine.genai, "embed_content", failing)
+    engine.index_code("repo", files)
+    assert engine.index_contents == []
+
+    def working(model, content, task_type=None):
+        return {"embedding": [[1.0] + [0.0] * (engine.embedding_dim - 1) for _ in content]}
+
+    monkeypatch.setattr(hybrid_engine.genai, "embed_content", working)
+    engine.index_code("repo", files)
+    assert engine.index_contents == [files[0]["content"]]
+
+    results = engine.search_code("repo", "add two numbers", k=1)
+    assert results[0]["content"] == files[0]["content"]
+    assert results[0]["relevance_score"] == pytest.approx(1.0)
+
+
+def _topic_embeddings(engine):
+    topics = ("add", "greet")
+
+    def embed(model, content, task_type=None):
+        vectors = []
+        for text in content:
+            vector = [0.0] * engine.embedding_dim
+            for i, topic in enumerate(topics):
+                if topic in text:
+                    vector[i] = 1.0
+            vectors.append(vector)
+        return {"embedding": vectors}
+
+    return embed
+
+
+def test_async_index_and_search_rank_on_the_cpu_pool(monkeypatch):
+    engine = RAGEngine("test-key", embedding_backend="gemini")
+    monkeypatch.setattr(hybrid_engine.genai, "embed_content", _topic_embeddings(engine))
+    threads = []
+
+    def recorded(method):
+        def wrapper(*args):
+            threads.append(threading.current_thread().name)
+            return method(*args)
+        return wrapper
+
+    monkeypatch.setattr(engine, "_add_to_index", recorded(engine._add_to_index))
+    monkeypatch.setattr(engine, "_rank", recorded(engine._rank))
+    files = [
+        {"content": "def add(a, b):\n    return a + b\n"},
+        {"content": "def greet(name):\n    print('hi', name)\n"},
+    ]
+
+    async def run():
+        added = await engine.aindex_code("repo", files)
+        return added, await engine.asearch_code("repo", "greet someone", k=1)
+
+    added, results = asyncio.run(run())
+
+    assert added == 2
+    assert results[0]["content"] == files[1]["content"]
+    assert len(threads) == 2
+    assert all(name.startswith("cpu") for name in threads)
+
+
+def test_astream_with_context_yields_chunks_then_caches(monkeypatch):
+    engine = RAGEngine("test-key", embedding_backend="gemini")
+    monkeypatch.setattr(hybrid_engine.genai, "embed_content", _topic_embeddings(engine))
+    calls = []
+
+    class Chunk:
+        def __init__(self, text):
+            self.text = text
+
+    class Model:
+        async def generate_content_async(self, prompt, stream=False):
+            calls.append(prompt)
+            
+            async def chunks():
+                for text in ("It adds ", "two numbers."):
+                    yield Chunk(text)
+            return chunks()
+
+    engine.model = Model()
+    context = [{"content": "def add(a, b):\n    return a + b\n"}]
+
+    async def collect():
+        return [text async for text in engine.astream_with_context("what does add do", context)]
+
+    assert asyncio.run(collect()) == ["It adds ", "two numbers."]
+    assert asyncio.run(collect()) == ["It adds two numbers."]
+    assert len(calls) == 1
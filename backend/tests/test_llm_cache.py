@@ -0,0 +1,64 @@
+import asyncio
+
+import pytest
+
+for module in ("google.generativeai", "cachetools", "fastapi"):
+    pytest.importorskip(module)
+
+import google.ai.generativelanguage as glm
+
+from core import llm_cache
+from core.llm_cache import GeminiModel, configure_gemini, generate_text
+
+
+class FakeClient:
+    def __init__(self, text):
+        self.text = text
+        self.requests = []
+    
+    async def generate_content(self, request):
+        self.requests.append(request)
+        return glm.GenerateContentResponse(candidates=[
+            glm.Candidate(content=glm.Content(parts=[glm.Part(text=self.text)]))
+        ])
+
+
+def test_models_are_shared_per_key():
+    async def models():
+        return configure_gemini("key-a"), configure_gemini("key-a"), configure_gemini("key-b")
+    
+    first, again, other = asyncio.run(models())
+    
+    assert isinstance(first, GeminiModel)
+    assert first is again
+    assert other is not first
+    assert other._client is not first._client
+
+
+def test_generate_text_goes_through_the_keyed_client():
+    async def generate():
+        model = GeminiModel("test-key")
+        model._client = FakeClient("print('hi')")
+        return model, await generate_text(model, "  say hi  ")
+    
+    llm_cache._responses.clear()
+    model, text = asyncio.run(generate())
+    
+    assert text == "print('hi')"
+    request = model._client.requests[0]
+    assert request.model == f"models/{llm_cache.MODEL_NAME}"
+    assert request.contents[0].parts[0].text == "  say hi  "
+
+
+def test_cached_responses_are_scoped_to_the_api_key():
+    async def generate():
+        first, second = GeminiModel("key-a"), GeminiModel("key-b")
+        first._client, second._client = FakeClient("from a"), FakeClient("from b")
+        return (await generate_text(first, "prompt"), await generate_text(second, "prompt"),
+                await generate_text(first, "prompt "), first._client)
+    
+    llm_cache._responses.clear()
+    from_a, from_b, again, client = asyncio.run(generate())
+    
+    assert (from_a, from_b, again) == ("from a", "from b", "from a")
+    assert len(client.requests) == 1
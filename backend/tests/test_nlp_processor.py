@@ -0,0 +1,112 @@
+import random
+
+import pytest
+
+pytest.importorskip("sklearn")
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.metrics.pairwise import cosine_similarity
+
+from core import nlp_processor
+from core.nlp_processor import NLPProcessor, TFIDF_OPTIONS
+
+
+def _sklearn_similarity(text1, text2):
+    tfidf_matrix = TfidfVectorizer(**TFIDF_OPTIONS).fit_transform([text1, text2])
+    return cosine_similarity(tfidf_matrix[0:1], tfidf_matrix[1:2])[0][0]
+
+
+def _random_text(rng, vocabulary, length):
+    return " ".join(rng.choice(vocabulary) for _ in range(length))
+
+
+@pytest.mark.parametrize("length", [40, 8000])
+def test_similarity_matches_fitted_vectorizer(length):
+    rng = random.Random(length)
+    vocabulary = [f"term{i}" for i in range(4000)]
+    text1 = _random_text(rng, vocabulary, length)
+    text2 = _random_text(rng, vocabulary, length)
+    
+    similarity = NLPProcessor().calculate_similarity(text1, text2)
+    
+    assert similarity == pytest.approx(_sklearn_similarity(text1, text2), abs=1e-9)
+
+
+def test_large_pair_exceeds_max_features():
+    # Guards the test above: the long texts must hit the vocabulary cap
+    rng = random.Random(8000)
+    vocabulary = [f"term{i}" for i in range(4000)]
+    texts = [_random_text(rng, vocabulary, 8000) for _ in range(2)]
+    
+    full = TfidfVectorizer(**{**TFIDF_OPTIONS, 'max_features': None}).fit(texts)
+    
+    assert len(full.vocabulary_) > TFIDF_OPTIONS['max_features']
+
+
+def test_failed_nltk_download_is_retried(monkeypatch):
+    def missing(path):
+        raise LookupError(path)
+    
+    downloads = []
+    results = iter([False] + [True] * 6)
+    
+    def download(package, quiet=False):
+        downloads.append(package)
+        return next(results)
+    
+    monkeypatch.setattr(nlp_processor, "_nltk_ready", False)
+    monkeypatch.setattr(nlp_processor.nltk.data, "find", missing)
+    monkeypatch.setattr(nlp_processor.nltk, "download", download)
+    
+    nlp_processor._ensure_nltk_data()
+    assert not nlp_processor._nltk_ready
+    
+    nlp_processor._ensure_nltk_data()
+    assert nlp_processor._nltk_ready
+    assert len(downloads) == 2 * len(nlp_processor.NLTK_PACKAGES)
+    
+    nlp_processor._ensure_nltk_data()
+    assert len(downloads) == 2 * len(nlp_processor.NLTK_PACKAGES)
+
+
+PYTHON_BRANCHES = '''
+def summarize(xs, flag):
+    total = 0
+    for x in xs:
+        if x > 0 and flag:
+            total += x
+        elif x < 0:
+            total -= x
+    evens = [x for x in xs if x % 2 == 0]
+    try:
+        return total if total else None
+    except ValueError:
+        return len(evens)
+'''
+
+JS_BRANCHES = '''
+function summarize(xs, flag) {
+  let total = 0;
+  for (const x of xs) {
+    if (x > 0 && flag) {
+      total += x;
+    } else if (x < 0 || !flag) {
+      total -= x;
+    }
+  }
+  switch (total) {
+    case 0: return -1;
+    default: return total;
+  }
+}
+'''
+
+
+def test_cyclomatic_complexity_of_python():
+    # 1 + for + if + and + elif + comprehension + its if + conditional
+    # expression + except
+    assert NLPProcessor()._calculate_cyclomatic_complexity(PYTHON_BRANCHES) == 9
+
+
+def test_cyclomatic_complexity_of_non_python():
+    # 1 + for + if + && + else if + || + case
+    assert NLPProcessor()._calculate_cyclomatic_complexity(JS_BRANCHES) == 7